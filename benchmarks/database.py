@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for the module `mastersign.datascience.database`.
+
+Run with ``asv run`` or ``asv dev`` from the root of the repository.
+The synthetic databases are created once per run in a temporary directory;
+creating the largest one with 10M rows takes about a minute.
+Select a subset with e.g. ``asv dev --bench Chinook``.
+"""
+
+import os
+import time
+import sqlite3
+import tempfile
+import numpy as np
+from mastersign.datascience import database as db
+
+
+def _create_numeric_db(filename, rows, columns):
+    rng = np.random.default_rng(42)
+    data = np.column_stack((
+        np.arange(rows),
+        rng.integers(0, 1000000, size=(rows, columns // 2)),
+        rng.random(size=(rows, columns - columns // 2 - 1))))
+    names = ['id'] + ['i{}'.format(i) for i in range(columns // 2)] \
+        + ['f{}'.format(i) for i in range(columns - columns // 2 - 1)]
+    types = ['INTEGER'] * (columns // 2 + 1) + ['REAL'] * (columns - columns // 2 - 1)
+    with sqlite3.connect(filename) as conn:
+        conn.execute('CREATE TABLE numbers ({})'.format(
+            ', '.join('{} {}'.format(n, t) for n, t in zip(names, types))))
+        conn.executemany(
+            'INSERT INTO numbers VALUES ({})'.format(', '.join('?' * columns)),
+            (tuple(int(v) if t == 'INTEGER' else float(v) for v, t in zip(row, types))
+             for row in data))
+
+
+class WideNumericReader:
+    """
+    Compares the reader ``'pandas'`` with the reader ``'columnar'``
+    of `load_query()` on a wide numeric result set.
+    """
+
+    params = (['pandas', 'columnar'], [10000, 100000])
+    param_names = ['reader', 'rows']
+    timeout = 300
+
+    def setup_cache(self):
+        directory = tempfile.mkdtemp()
+        filenames = dict()
+        for rows in self.params[1]:
+            filename = os.path.join(directory, 'numeric_{}.db'.format(rows))
+            _create_numeric_db(filename, rows, 50)
+            filenames[rows] = filename
+        return filenames
+
+    def setup(self, filenames, reader, rows):
+        self.db_conn = 'sqlite:///' + filenames[rows]
+        db.get_engine(self.db_conn)
+
+    def time_load_query(self, filenames, reader, rows):
+        db.load_query('SELECT * FROM numbers', db_conn=self.db_conn,
+                      reader=reader, cache=False)
+
+    def peakmem_load_query(self, filenames, reader, rows):
+        db.load_query('SELECT * FROM numbers', db_conn=self.db_conn,
+                      reader=reader, cache=False)
+
+
+_categories = np.array(['alpha', 'beta', 'gamma', 'delta', 'epsilon'])
+
+
+def _create_mixed_db(filename, rows, batch=100000):
+    # creates a table with numeric, text and date columns in batches,
+    # to keep the memory usage low for large tables
+    rng = np.random.default_rng(42)
+    start = np.datetime64('2020-01-01T00:00:00')
+    with sqlite3.connect(filename) as conn:
+        conn.execute('CREATE TABLE measurements ('
+                     'id INTEGER PRIMARY KEY, value REAL, count INTEGER, '
+                     'category TEXT, label TEXT, created TEXT)')
+        for offset in range(0, rows, batch):
+            n = min(batch, rows - offset)
+            created = start + rng.integers(0, 3 * 365 * 86400, size=n).astype('timedelta64[s]')
+            conn.executemany(
+                'INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?)',
+                zip(range(offset, offset + n),
+                    rng.normal(size=n).tolist(),
+                    rng.integers(0, 1000, size=n).tolist(),
+                    _categories[rng.integers(0, len(_categories), size=n)].tolist(),
+                    ('label {}'.format(i) for i in rng.integers(0, 100000, size=n)),
+                    np.char.replace(created.astype(str), 'T', ' ').tolist()))
+
+
+def _rows_per_second(function, rows):
+    start = time.perf_counter()
+    function()
+    return rows / (time.perf_counter() - start)
+
+
+class MixedTable:
+    """
+    Measures loading a table with numeric, text and date columns
+    from the database and from the cache file, and scalar queries,
+    on synthetic SQLite databases with 10k to 10M rows.
+    """
+
+    params = [10000, 100000, 1000000, 10000000]
+    param_names = ['rows']
+    timeout = 1800
+
+    def setup_cache(self):
+        directory = tempfile.mkdtemp()
+        files = dict()
+        for rows in self.params:
+            filename = os.path.join(directory, 'mixed_{}.db'.format(rows))
+            _create_mixed_db(filename, rows)
+            cachefile = os.path.join(directory, 'mixed_{}.parq'.format(rows))
+            db.load_query('SELECT * FROM measurements', db_conn='sqlite:///' + filename,
+                          date='created', cachefile=cachefile)
+            files[rows] = (filename, cachefile)
+        return files
+
+    def setup(self, files, rows):
+        filename, self.cachefile = files[rows]
+        self.db_conn = 'sqlite:///' + filename
+        db.get_engine(self.db_conn)
+
+    def load_query(self):
+        return db.load_query('SELECT * FROM measurements', db_conn=self.db_conn,
+                             date='created', cache=False)
+
+    def load_table(self):
+        return db.load_table('measurements', columns=['id', 'value', 'category', 'created'],
+                             where=["category IN ('alpha', 'beta')", 'count < 500'],
+                             date='created', dtype={'category': 'category'},
+                             db_conn=self.db_conn, cache=False)
+
+    def load_cached(self):
+        return db.load_query('SELECT * FROM measurements', db_conn=self.db_conn,
+                             date='created', cachefile=self.cachefile)
+
+    def time_load_query(self, files, rows):
+        self.load_query()
+
+    def peakmem_load_query(self, files, rows):
+        self.load_query()
+
+    def track_load_query_rows_per_second(self, files, rows):
+        return _rows_per_second(self.load_query, rows)
+
+    track_load_query_rows_per_second.unit = 'rows/s'
+
+    def time_load_table(self, files, rows):
+        self.load_table()
+
+    def peakmem_load_table(self, files, rows):
+        self.load_table()
+
+    def time_cache_hit(self, files, rows):
+        self.load_cached()
+
+    def peakmem_cache_hit(self, files, rows):
+        self.load_cached()
+
+    def track_cache_hit_rows_per_second(self, files, rows):
+        return _rows_per_second(self.load_cached, rows)
+
+    track_cache_hit_rows_per_second.unit = 'rows/s'
+
+    def time_load_scalar(self, files, rows):
+        db.load_scalar('SELECT AVG(value) FROM measurements WHERE category = :category',
+                       db_conn=self.db_conn, category='gamma')
+
+    def time_load_scalars(self, files, rows):
+        db.load_scalars(['SELECT COUNT(*) FROM measurements',
+                         'SELECT MIN(created) FROM measurements',
+                         'SELECT MAX(created) FROM measurements',
+                         'SELECT SUM(count) FROM measurements'],
+                        db_conn=self.db_conn)
+
+
+class Chinook:
+    """
+    Measures realistic queries with joins on the demo database
+    ``demo-data/chinook.db``.
+    """
+
+    timeout = 300
+
+    sales_query = """
+        SELECT i.InvoiceDate, c.Country, g.Name AS Genre, t.Name AS Track,
+               ii.UnitPrice * ii.Quantity AS Amount
+        FROM invoice_items ii
+        JOIN invoices i ON i.InvoiceId = ii.InvoiceId
+        JOIN customers c ON c.CustomerId = i.CustomerId
+        JOIN tracks t ON t.TrackId = ii.TrackId
+        JOIN genres g ON g.GenreId = t.GenreId
+    """
+
+    genre_query = """
+        SELECT g.Name AS Genre, COUNT(*) AS Sales, SUM(ii.UnitPrice * ii.Quantity) AS Revenue
+        FROM invoice_items ii
+        JOIN tracks t ON t.TrackId = ii.TrackId
+        JOIN genres g ON g.GenreId = t.GenreId
+        GROUP BY g.Name
+        ORDER BY Revenue DESC
+    """
+
+    def setup(self):
+        self.db_conn = 'sqlite:///' + os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', 'demo-data', 'chinook.db')
+        db.get_engine(self.db_conn)
+        self.rows = db.load_scalar('SELECT COUNT(*) FROM invoice_items', db_conn=self.db_conn)
+        self.cachefile = os.path.join(tempfile.mkdtemp(), 'sales.parq')
+        db.load_query(self.sales_query, db_conn=self.db_conn,
+                      date='InvoiceDate', cachefile=self.cachefile)
+
+    def load_sales(self):
+        return db.load_query(self.sales_query, db_conn=self.db_conn,
+                             date='InvoiceDate', dtype={'Country': 'category', 'Genre': 'category'},
+                             cache=False)
+
+    def time_join_sales(self):
+        self.load_sales()
+
+    def peakmem_join_sales(self):
+        self.load_sales()
+
+    def track_join_sales_rows_per_second(self):
+        return _rows_per_second(self.load_sales, self.rows)
+
+    track_join_sales_rows_per_second.unit = 'rows/s'
+
+    def time_join_genre_revenue(self):
+        db.load_query(self.genre_query, db_conn=self.db_conn, cache=False)
+
+    def time_load_table_tracks(self):
+        db.load_table('tracks', columns=['TrackId', 'Name', 'GenreId', 'Milliseconds'],
+                      where='Milliseconds > 200000', db_conn=self.db_conn, cache=False)
+
+    def time_cache_hit_sales(self):
+        db.load_query(self.sales_query, db_conn=self.db_conn,
+                      date='InvoiceDate', cachefile=self.cachefile)
+
+    def time_load_scalar(self):
+        db.load_scalar('SELECT SUM(Total) FROM invoices WHERE BillingCountry = :country',
+                       db_conn=self.db_conn, country='USA')
@@ -5,10 +5,26 @@ This module contains functionality to comfortably access a SQL database.
 """
 
 import os
+import re
+import atexit
+import operator
+import time
+import json
+import shutil
+import hashlib
+import tempfile
+from threading import Lock, Event, Thread, local
+from queue import Queue, Full
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, text
+from collections import namedtuple, OrderedDict
+from sqlalchemy import create_engine, text, table, column, insert, delete, and_, bindparam
+from sqlalchemy import inspect, event, types as sqltypes
 from ..files import read_parquet as read_cachefile
 from ..files import write_parquet as write_cachefile
+from ..files import open_parquet as open_cachefile
 
 try:
     from collections.abc import Iterable
@@ -18,15 +34,617 @@ except:
 
 _def_db_conn = None
 
+_engines = dict()
+_engines_lock = Lock()
 
-def set_default_db_conn(db_conn):
+WriteStats = namedtuple('WriteStats', ['rows', 'seconds', 'rows_per_second'])
+WriteStats.__doc__ = """
+The result of `write_table()` and `upsert_table()`.
+
+:ivar rows:            The number of written rows.
+:ivar seconds:         The duration of the write operation in seconds.
+:ivar rows_per_second: The throughput of the write operation.
+"""
+
+_cache_dir = None
+_cache_ttl = None
+_cache_max_bytes = None
+_cache_lock = Lock()
+
+_spill_dir = None
+
+MemoStats = namedtuple('MemoStats', ['hits', 'misses', 'entries', 'bytes'])
+MemoStats.__doc__ = """
+The statistics of the in-process result memo, see `memo_stats()`.
+
+:ivar hits:    The number of results served from the memo.
+:ivar misses:  The number of results not found in the memo.
+:ivar entries: The number of results currently in the memo.
+:ivar bytes:   The memory usage of the results currently in the memo.
+"""
+
+_memo = OrderedDict()
+_memo_max_bytes = None
+_memo_copy = True
+_memo_bytes = 0
+_memo_hits = 0
+_memo_misses = 0
+_memo_lock = Lock()
+
+_load_listeners = []
+_load_stats = None
+_load_stats_lock = Lock()
+_instrumentation = local()
+
+_phases = ('connect', 'execute', 'fetch', 'convert', 'concat', 'cache_read', 'cache_write')
+
+
+def set_default_db_conn(db_conn, pool_size=None, max_overflow=None):
     """
     Sets the default connection string for subsequent database queries.
 
-    :param db_conn: A SqlAlchemy connection string.
+    :param db_conn:      A SqlAlchemy connection string,
+                         or `None` to reset the default.
+    :param pool_size:    The number of connections to keep open
+                         in the connection pool. (optional)
+    :param max_overflow: The number of connections to allow in excess
+                         of `pool_size`. (optional)
     """
     global _def_db_conn
     _def_db_conn = db_conn
+    if db_conn is not None:
+        get_engine(db_conn, pool_size=pool_size, max_overflow=max_overflow)
+
+
+def get_engine(db_conn=None, pool_size=None, max_overflow=None):
+    """
+    Get a pooled SqlAlchemy engine from the process-wide engine registry.
+
+    The engine for a connection string is created on the first call
+    and reused by all subsequent calls, so that queries can share
+    warm connections from its connection pool.
+    If `pool_size` or `max_overflow` are given and differ from the
+    options of the registered engine, the engine is disposed and replaced.
+
+    :param db_conn:      A SqlAlchemy connection string. (optional)
+    :param pool_size:    The number of connections to keep open
+                         in the connection pool. (optional)
+    :param max_overflow: The number of connections to allow in excess
+                         of `pool_size`. (optional)
+                         Not supported by all pool classes,
+                         e.g. not by the pool for SQLite in-memory databases.
+
+    :return: A SqlAlchemy engine
+    """
+    db_conn = db_conn or _def_db_conn
+    if db_conn is None:
+        raise ValueError("No connection string given and no default connection set.")
+    options = dict()
+    if pool_size is not None:
+        options['pool_size'] = pool_size
+    if max_overflow is not None:
+        options['max_overflow'] = max_overflow
+    with _engines_lock:
+        entry = _engines.get(db_conn)
+        if entry is not None:
+            engine, engine_options = entry
+            if not options or options == engine_options:
+                return engine
+            engine.dispose()
+        engine = create_engine(db_conn, **options)
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        _engines[db_conn] = (engine, options)
+        return engine
+
+
+def dispose_engines():
+    """
+    Dispose all engines in the process-wide engine registry
+    and close their pooled connections.
+
+    Is called automatically at interpreter shutdown.
+    """
+    with _engines_lock:
+        for engine, _ in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+atexit.register(dispose_engines)
+
+
+def set_cache_dir(path, ttl=None, max_bytes=None):
+    """
+    Sets a directory for automatically managed cache files.
+
+    If a cache directory is set, `load_query()` and `load_table()`
+    cache their results in this directory, unless an explicit `cachefile`
+    is given or the cache is disabled with ``cache=False``.
+    The cache entries are keyed by a hash of the normalized SQL query,
+    the bind parameters, the connection string and the options
+    `date`, `defaults`, `dtype` and `index`.
+    Therefore, a changed query or changed parameters never hit a stale entry.
+
+    :param path:      A path to a directory or `None` to deactivate
+                      the managed cache.
+                      The directory is created if it does not exist.
+    :param ttl:       The default time to live of a cache entry in seconds.
+                      (optional)
+                      If `None` is given, entries do not expire.
+    :param max_bytes: The maximum total size of all cache files in bytes.
+                      (optional)
+                      If the size is exceeded, the least recently used
+                      entries are removed.
+    """
+    global _cache_dir, _cache_ttl, _cache_max_bytes
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+    _cache_dir = path
+    _cache_ttl = ttl
+    _cache_max_bytes = max_bytes
+
+
+def clear_cache():
+    """
+    Removes all entries from the managed cache directory.
+
+    See `set_cache_dir()` for more details.
+    """
+    if not _cache_dir:
+        return
+    with _cache_lock:
+        for filename in os.listdir(_cache_dir):
+            if filename.endswith('.parq') or filename.endswith('.json'):
+                os.remove(os.path.join(_cache_dir, filename))
+
+
+def _spill_file():
+    # returns the path for a new spill file in a temporary directory,
+    # which is removed when the process exits
+    global _spill_dir
+    with _cache_lock:
+        if _spill_dir is None:
+            _spill_dir = tempfile.mkdtemp(prefix='mastersign-spill-')
+            atexit.register(shutil.rmtree, _spill_dir, True)
+    fd, filename = tempfile.mkstemp(suffix='.parq', dir=_spill_dir)
+    os.close(fd)
+    return filename
+
+
+def _normalize_cache_arg(value):
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _normalize_cache_arg(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(map(repr, value)))
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_normalize_cache_arg, value))
+    if isinstance(value, (np.ndarray, pd.Series, pd.Index)):
+        # the repr of large arrays is abbreviated
+        return tuple(map(_normalize_cache_arg, value.tolist()))
+    return repr(value)
+
+
+def _cache_key(query, db_conn, bindparams, **options):
+    spec = (' '.join(query.split()).rstrip(' ;'),
+            str(db_conn or _def_db_conn),
+            _normalize_cache_arg(bindparams),
+            _normalize_cache_arg(options))
+    return hashlib.sha256(repr(spec).encode('utf-8')).hexdigest()
+
+
+def _managed_cachefile(key):
+    # returns the path of a cache file in the managed cache directory;
+    # removes the entry if expired and marks it as recently used otherwise
+    cachefile = os.path.join(_cache_dir, key + '.parq')
+    metafile = os.path.join(_cache_dir, key + '.json')
+    with _cache_lock:
+        if not os.path.exists(cachefile):
+            return cachefile
+        try:
+            with open(metafile, 'r') as fp:
+                expires = json.load(fp).get('expires')
+        except (FileNotFoundError, ValueError):
+            expires = None
+        if expires is not None and expires < time.time():
+            os.remove(cachefile)
+            if os.path.exists(metafile):
+                os.remove(metafile)
+        else:
+            os.utime(cachefile)
+    return cachefile
+
+
+def _register_managed_cachefile(key, ttl):
+    now = time.time()
+    with _cache_lock:
+        with open(os.path.join(_cache_dir, key + '.json'), 'w') as fp:
+            json.dump({'created': now,
+                       'expires': now + ttl if ttl is not None else None}, fp)
+        if _cache_max_bytes is None:
+            return
+        entries = []
+        for filename in os.listdir(_cache_dir):
+            if not filename.endswith('.parq'):
+                continue
+            st = os.stat(os.path.join(_cache_dir, filename))
+            entries.append((st.st_mtime, st.st_size, filename[:-5]))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_key in sorted(entries):
+            if total <= _cache_max_bytes:
+                break
+            if entry_key == key:
+                continue
+            for extension in ('.parq', '.json'):
+                filename = os.path.join(_cache_dir, entry_key + extension)
+                if os.path.exists(filename):
+                    os.remove(filename)
+            total -= size
+
+
+def add_load_listener(callback):
+    """
+    Registers a callback, which is called after every instrumented
+    database call with a dict of measurements.
+
+    The instrumented functions are `execute()`, `load_scalar()`,
+    `load_query()` and `load_table()`.
+    A nested call, e.g. `load_query()` called by `load_table()`,
+    contributes to the measurements of the outer call.
+    Partitions loaded in parallel are measured separately.
+
+    The dict contains the following keys:
+    ``function``, ``query``, ``start`` (a Unix timestamp), ``seconds``,
+    the wall time per phase in seconds
+    ``connect``, ``execute``, ``fetch``, ``convert``, ``concat``,
+    ``cache_read``, ``cache_write``,
+    further ``rows``, ``bytes`` (the memory usage of the loaded chunks),
+    ``chunks``, ``chunksizes`` (the list of chunk sizes chosen
+    with ``chunksize='auto'``), ``cache_hit``, ``spilled`` (if the result
+    exceeded `max_memory`) and ``error``.
+
+    :param callback: A function taking one dict as argument.
+    """
+    with _load_stats_lock:
+        _load_listeners.append(callback)
+
+
+def remove_load_listener(callback):
+    """
+    Removes a callback registered with `add_load_listener()`.
+
+    :param callback: The registered function.
+    """
+    with _load_stats_lock:
+        _load_listeners.remove(callback)
+
+
+def record_load_stats(enabled=True):
+    """
+    Activates or deactivates the in-process registry of measurements
+    for instrumented database calls.
+
+    See `add_load_listener()` for a description of the measurements.
+
+    :param enabled: A switch to activate the registry. (optional)
+                    Deactivating the registry discards the recorded
+                    measurements.
+    """
+    global _load_stats
+    with _load_stats_lock:
+        if not enabled:
+            _load_stats = None
+        elif _load_stats is None:
+            _load_stats = []
+
+
+def load_stats():
+    """
+    Returns the measurements recorded since `record_load_stats()`.
+
+    :return: A Pandas DataFrame with one row per instrumented call.
+    """
+    with _load_stats_lock:
+        records = list(_load_stats or [])
+    return pd.DataFrame.from_records(
+        records, columns=['function', 'query', 'start', 'seconds', *_phases,
+                          'rows', 'bytes', 'chunks', 'chunksizes', 'cache_hit', 'spilled',
+                          'error'])
+
+
+def clear_load_stats():
+    """
+    Discards the recorded measurements, but keeps recording.
+    """
+    with _load_stats_lock:
+        if _load_stats is not None:
+            _load_stats.clear()
+
+
+def _current_record():
+    return getattr(_instrumentation, 'record', None)
+
+
+@contextmanager
+def _instrument(function, query):
+    # measures an instrumented call, if measurements are requested
+    # and no outer call in the same thread is measured already
+    if (not _load_listeners and _load_stats is None) or _current_record() is not None:
+        yield
+        return
+    record = {'function': function, 'query': query, 'start': time.time(), 'seconds': 0.0}
+    record.update((phase, 0.0) for phase in _phases)
+    record.update(rows=0, bytes=0, chunks=0, chunksizes=None,
+                  cache_hit=False, spilled=False, error=None)
+    _instrumentation.record = record
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        record['error'] = repr(e)
+        raise
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        _instrumentation.record = None
+        with _load_stats_lock:
+            if _load_stats is not None:
+                _load_stats.append(record)
+            listeners = list(_load_listeners)
+        for listener in listeners:
+            listener(record)
+
+
+@contextmanager
+def _phase(name):
+    record = _current_record()
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record[name] += time.perf_counter() - start
+
+
+def _count_chunk(c):
+    record = _current_record()
+    if record is not None:
+        record['rows'] += len(c)
+        record['bytes'] += int(c.memory_usage(deep=True).sum())
+        record['chunks'] += 1
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record = _current_record()
+    if record is not None:
+        conn.info['instrumentation_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record = _current_record()
+    start = conn.info.pop('instrumentation_start', None)
+    if record is not None and start is not None:
+        record['execute'] += time.perf_counter() - start
+
+
+def _connect(db_conn, **execution_options):
+    with _phase('connect'):
+        conn = get_engine(db_conn).connect()
+        if execution_options:
+            conn = conn.execution_options(**execution_options)
+        return conn
+
+
+def _fetch(iterator):
+    # yields the items of the iterator and measures the time
+    # to fetch them without the time for executing statements
+    record = _current_record()
+    while True:
+        if record is None:
+            item = next(iterator, None)
+        else:
+            start = time.perf_counter()
+            executed = record['execute']
+            item = next(iterator, None)
+            record['fetch'] += time.perf_counter() - start - (record['execute'] - executed)
+        if item is None:
+            return
+        yield item
+
+
+def _prefetch(produce, size):
+    # runs the generator function `produce` in a background thread,
+    # which fills a bounded queue with up to `size` items,
+    # and yields the items from the queue
+    items = Queue(maxsize=size)
+    stop = Event()
+    record = _current_record()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def worker():
+        # measure the fetch phase in the background thread
+        # with the record of the calling thread
+        _instrumentation.record = record
+        generator = produce()
+        try:
+            for item in generator:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((None, e))
+            return
+        finally:
+            generator.close()
+            _instrumentation.record = None
+        put((None, None))
+
+    thread = Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is None:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def set_memo(max_bytes, copy=True):
+    """
+    Activates an in-process memo for the results of `load_query()`
+    and `load_table()`.
+
+    Repeated calls with the same arguments return the memoized DataFrame
+    instead of querying the database or reading the cache file.
+    The memo is keyed like the managed cache, see `set_cache_dir()`.
+    If the memory usage of all memoized DataFrames exceeds the budget,
+    the least recently used results are dropped.
+    Lazy `fastparquet.ParquetFile` handles and incremental loads
+    are not memoized.
+
+    :param max_bytes: The maximum memory usage of all memoized DataFrames
+                      in bytes, or `None` to deactivate the memo.
+    :param copy:      A switch to return a copy of a memoized DataFrame.
+                      (optional)
+                      If `False`, a read-only view of the memoized DataFrame
+                      is returned, which shares the data with the memo.
+                      The arrays of the view can not be written and
+                      modifying the view copies the affected columns
+                      (Copy-on-Write), so the memo is never changed.
+                      Without Copy-on-Write, which pandas enables
+                      since version 3, a copy is returned anyway.
+    """
+    global _memo_max_bytes, _memo_copy
+    with _memo_lock:
+        _memo_max_bytes = max_bytes
+        _memo_copy = copy
+    if max_bytes is None:
+        clear_memo()
+    else:
+        _evict_memo()
+
+
+def clear_memo():
+    """
+    Drops all results from the in-process memo and resets the statistics.
+    """
+    global _memo_bytes, _memo_hits, _memo_misses
+    with _memo_lock:
+        _memo.clear()
+        _memo_bytes = 0
+        _memo_hits = 0
+        _memo_misses = 0
+
+
+def memo_stats():
+    """
+    Returns the statistics of the in-process memo.
+
+    :return: A `MemoStats` tuple.
+    """
+    with _memo_lock:
+        return MemoStats(_memo_hits, _memo_misses, len(_memo), _memo_bytes)
+
+
+def _memo_get(key):
+    global _memo_hits, _memo_misses
+    with _memo_lock:
+        entry = _memo.get(key)
+        if entry is None:
+            _memo_misses += 1
+            return None
+        _memo.move_to_end(key)
+        _memo_hits += 1
+        df, copy = entry[0], _memo_copy
+    record = _current_record()
+    if record is not None:
+        record['cache_hit'] = True
+    return df.copy() if copy else _read_only_view(df)
+
+
+def _copy_on_write():
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    return pd.get_option('mode.copy_on_write') is True
+
+
+def _read_only_view(df):
+    # a shallow copy shares the data with the memoized DataFrame,
+    # with Copy-on-Write a modification of the copy never reaches the memo
+    if not _copy_on_write():
+        return df.copy()
+    return df.copy(deep=False)
+
+
+def _memo_put(key, df):
+    global _memo_bytes
+    if not isinstance(df, pd.DataFrame):
+        return df
+    size = int(df.memory_usage(deep=True, index=True).sum())
+    with _memo_lock:
+        if _memo_max_bytes is None or size > _memo_max_bytes:
+            return df
+        if key in _memo:
+            _memo_bytes -= _memo.pop(key)[1]
+        _memo[key] = (df, size)
+        _memo_bytes += size
+        copy = _memo_copy
+    _evict_memo()
+    return df.copy() if copy else _read_only_view(df)
+
+
+def _evict_memo():
+    global _memo_bytes
+    with _memo_lock:
+        while _memo and _memo_max_bytes is not None and _memo_bytes > _memo_max_bytes:
+            _, (_, size) = _memo.popitem(last=False)
+            _memo_bytes -= size
+
+
+def _is_collection(value):
+    return isinstance(value, (list, tuple, set, frozenset, np.ndarray, pd.Series, pd.Index))
+
+
+def _collection_values(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if isinstance(value, (np.ndarray, pd.Series, pd.Index)):
+        return value.tolist()
+    return list(value)
+
+
+def _in_list_names(sql, kwargs):
+    # returns the names of the bind parameters with collections,
+    # which are used as IN-lists, like ``WHERE id IN :ids``,
+    # other collections are bound as they are, e.g. as arrays
+    return [name for name, value in kwargs.items()
+            if _is_collection(value) and
+            re.search(r'\bIN\s+:{}\b'.format(re.escape(name)), sql, re.IGNORECASE)]
+
+
+def _text(sql, kwargs):
+    # builds a text clause with bind parameters and expands
+    # collections as IN-lists, like ``WHERE id IN :ids``
+    clause = text(sql)
+    in_lists = _in_list_names(sql, kwargs)
+    if not in_lists:
+        return clause.bindparams(**kwargs)
+    return clause.bindparams(*[bindparam(name, expanding=True) for name in in_lists]) \
+        .bindparams(**{name: _collection_values(value) if name in in_lists else value
+                       for name, value in kwargs.items()})
 
 
 def execute(sql, db_conn=None, **kwargs):
@@ -38,18 +656,211 @@ def execute(sql, db_conn=None, **kwargs):
     :param kwargs:  Additional named arguments,
                     passed to `sqlalchemy.sql.expression.TextClause.bindparams()`.
     """
-    engine = create_engine(db_conn or _def_db_conn)
-    try:
-        with engine.connect() as conn:
-            conn.execute(text(sql).bindparams(**kwargs))
+    with _instrument('execute', sql), _connect(db_conn) as conn:
+        conn.execute(_text(sql, kwargs))
+        conn.commit()
+
+
+def _statements(statements):
+    # yields pairs of a text clause and bind parameters
+    for statement in statements:
+        if type(statement) is str:
+            yield text(statement), None
+        else:
+            sql, params = statement
+            yield text(sql), params
+
+
+def execute_many(statements, db_conn=None, transaction=True):
+    """
+    Execute multiple SQL statements on one connection, returning no data.
+
+    :param statements:  An iterable with statements.
+                        A statement is a string, or a pair with a string
+                        and a dict with bind parameters,
+                        or a pair with a string and a list of dicts,
+                        to execute the statement once per parameter set.
+    :param db_conn:     A SqlAlchemy connection string. (optional)
+    :param transaction: A switch to execute all statements
+                        in one transaction. (optional)
+                        If `False`, every statement is committed separately.
+
+    :return: A list with the number of affected rows per statement.
+    """
+    with _instrument('execute_many', None), _connect(db_conn) as conn:
+        rowcounts = []
+        for statement, params in _statements(statements):
+            rowcounts.append(conn.execute(statement, params).rowcount)
+            if not transaction:
+                conn.commit()
+        if transaction:
             conn.commit()
-    finally:
-        engine.dispose()
+        return rowcounts
+
+
+def _chunk_processor(defaults, dtype):
+    # columns with the dtype 'category' get the running union
+    # of the categories of all chunks so far, so that the codes of earlier
+    # chunks stay valid and the chunks can be concatenated cheaply
+    categories = dict()
+    if dtype:
+        categories = {c: pd.Index([]) for c, t in dtype.items()
+                      if isinstance(t, str) and t == 'category'}
+        if categories:
+            plain_dtype = {c: t for c, t in dtype.items() if c not in categories}
+
+    def categorize(c):
+        for column, known in categories.items():
+            if column not in c.columns:
+                continue
+            values = c[column]
+            new = pd.Index(values.dropna().unique()).difference(known, sort=False)
+            if len(new):
+                known = known.append(new)
+                categories[column] = known
+            c[column] = pd.Categorical(values, categories=known)
+        return c
+
+    def process_chunk(c):
+        if defaults:
+            c.fillna(defaults, inplace=True, downcast=dtype)
+        if dtype:
+            before = c.memory_usage(deep=True).sum() if isinstance(dtype, DtypePlan) else 0
+            if categories:
+                if plain_dtype:
+                    c = c.astype(plain_dtype, copy=False)
+                c = categorize(c)
+            else:
+                c = c.astype(dtype, copy=False)
+            if isinstance(dtype, DtypePlan):
+                dtype.record(before, _chunk_memory_usage(c))
+        return c
+    return process_chunk
+
+
+def _chunk_memory_usage(c):
+    # the categories of categorical columns are shared between the chunks
+    # and therefore only the codes are counted
+    return c.index.memory_usage(deep=True) + sum(
+        c[column].cat.codes.nbytes
+        if isinstance(c[column].dtype, pd.CategoricalDtype)
+        else c[column].memory_usage(deep=True, index=False)
+        for column in c.columns)
+
+
+def _concat_chunks(chunks):
+    # concatenates chunks and unifies differing categories beforehand,
+    # to keep categorical columns compact
+    if len(chunks) == 1:
+        return chunks[0]
+    first = chunks[0]
+    for column in first.columns:
+        if not isinstance(first[column].dtype, pd.CategoricalDtype):
+            continue
+        dtypes = [c[column].dtype for c in chunks]
+        if all(t == dtypes[0] for t in dtypes[1:]):
+            continue
+        union = dtypes[0].categories
+        for t in dtypes[1:]:
+            union = union.append(t.categories.difference(union, sort=False))
+        union_dtype = pd.CategoricalDtype(union, ordered=dtypes[0].ordered)
+        for c, t in zip(chunks, dtypes):
+            if t.categories.equals(union[:len(t.categories)]):
+                # the categories are a prefix of the union, so the codes stay valid
+                c[column] = pd.Categorical.from_codes(c[column].cat.codes, dtype=union_dtype)
+            else:
+                c[column] = c[column].cat.set_categories(union)
+    return pd.concat(chunks)
+
+
+def iter_query(query, db_conn=None,
+               date=None, defaults=None, dtype=None, index=None,
+               chunksize=4096, prefetch=0, **kwargs):
+    """
+    Load data from an arbitrary SQL query chunk by chunk.
+
+    Works like `load_query()`, but yields every chunk as a separate
+    DataFrame, instead of concatenating all chunks into one DataFrame.
+    This allows to process results, which do not fit into memory.
+    The connection stays open until the generator is exhausted or closed.
+
+    :param query:   A string as a SQL query.
+    :param db_conn: A SqlAlchemy connection string. (optional)
+    :param date:    A column name or an iterable with column names,
+                    or a dict with column names and date format strings,
+                    for parsing specific columns as datetimes. (optional)
+    :param defaults:
+                    A dict with column names and default values for
+                    `NULL` values. (optional)
+                    See `load_query()` for more details.
+    :param dtype:   A dict with column names and NumPy datatypes
+                    or ``'category'``. (optional)
+                    See `pandas.DataFrame.astype()` for details.
+    :param index:   A column name or an iterable with column names,
+                    which will be the index in the resulting DataFrames.
+                    (optional)
+    :param chunksize:
+                    The maximum number of rows in a chunk,
+                    or ``'auto'`` to adapt the number of rows. (optional)
+                    See `load_query()` for more details.
+    :param prefetch:
+                    The number of chunks to fetch ahead in a background
+                    thread, while the current chunk is converted. (optional)
+                    See `load_query()` for more details.
+    :param kwargs:  Additional named arguments
+                    are passed to `sqlalchemy.sql.expression.TextClause.bindparams()`.
+
+    :return: A generator of Pandas DataFrames
+    """
+    if type(date) is str:
+        date = (date,)
+    process_chunk = _chunk_processor(defaults, dtype)
+    tuner = _ChunkTuner() if isinstance(chunksize, str) and chunksize == 'auto' else None
+
+    if prefetch or tuner:
+        # fetch the raw chunks, in a background thread if requested,
+        # and parse the dates in the converting thread
+        def fetch():
+            with _connect(db_conn, stream_results=True) as conn:
+                if tuner:
+                    yield from _fetch(tuner.iter_chunks(conn.execute(_text(query, kwargs))))
+                else:
+                    yield from _fetch(iter(pd.read_sql_query(_text(query, kwargs),
+                                                             conn,
+                                                             chunksize=chunksize)))
+
+        chunks = _prefetch(fetch, prefetch) if prefetch else fetch()
+        try:
+            for chunk in chunks:
+                start = time.perf_counter()
+                with _phase('convert'):
+                    chunk = process_chunk(_prepare_frame(chunk, date, index))
+                if tuner:
+                    tuner.observe(chunk, time.perf_counter() - start)
+                _count_chunk(chunk)
+                yield chunk
+        finally:
+            chunks.close()
+        return
+
+    with _connect(db_conn, stream_results=True) as conn:
+        for chunk in _fetch(iter(pd.read_sql_query(_text(query, kwargs),
+                                                   conn,
+                                                   index_col=index,
+                                                   parse_dates=date,
+                                                   chunksize=chunksize))):
+            with _phase('convert'):
+                chunk = process_chunk(chunk)
+            _count_chunk(chunk)
+            yield chunk
 
 
 def load_query(query, db_conn=None,
                date=None, defaults=None, dtype=None, index=None,
                chunksize=4096, cachefile=None, compress_cache=False,
+               stream_cache=False, cache=True, cache_ttl=None,
+               reader='pandas', memo=True, prefetch=0,
+               in_batch_size=1000, max_workers=None, max_memory=None,
                **kwargs):
     """
     Load data from an arbitrary SQL query.
@@ -68,12 +879,24 @@ def load_query(query, db_conn=None,
     :param dtype:   A dict with column names and NumPy datatypes
                     or ``'category'``. (optional)
                     See `pandas.DataFrame.astype()` for details.
+                    The categories of ``'category'`` columns are collected
+                    over all chunks, so the result keeps compact
+                    categorical columns. To use a fixed list of categories,
+                    pass a `pandas.CategoricalDtype` instead.
     :param index:   A column name or an iterable with column names,
                     which will be the index in the resulting DataFrame.
                     (optional)
     :param chunksize:
                     The number of rows to load in a chunk before
                     converting them into a Pandas DataFrame. (optional)
+                    If ``'auto'`` is given, the memory usage per row
+                    and the time to fetch and convert the first chunks
+                    are measured, and the number of rows is adapted
+                    towards chunks of about 8 MiB and 0.25 seconds.
+                    The chosen sizes are recorded in the instrumentation,
+                    see `add_load_listener()`.
+                    The columnar reader fetches 4096 rows at a time
+                    with ``'auto'``.
     :param cachefile:
                     A path to a file to cache the result data from the query.
                     (optional)
@@ -81,49 +904,443 @@ def load_query(query, db_conn=None,
                     instead of connecting to the database.
     :param compress_cache:
                     A switch to activate data compression for the cache file.
+    :param stream_cache:
+                    A switch to write every chunk directly into the cache file
+                    as a separate row group, without building the
+                    complete DataFrame in memory. (optional)
+                    If set, a lazy `fastparquet.ParquetFile` handle
+                    for the cache file is returned instead of a DataFrame.
+                    Requires `cachefile` or a managed cache directory.
+    :param cache:   A switch to use the managed cache directory,
+                    if no `cachefile` is given. (optional)
+                    See `set_cache_dir()` for more details.
+    :param cache_ttl:
+                    The time to live for a new entry in the managed cache
+                    in seconds. (optional)
+                    Defaults to the TTL given to `set_cache_dir()`.
+    :param reader:  The method to read the result rows. (optional)
+                    ``'pandas'`` reads every chunk with
+                    `pandas.read_sql_query()` and concatenates the chunks.
+                    ``'columnar'`` fetches the rows with `fetchmany()`
+                    directly into growing NumPy arrays per column,
+                    and builds the DataFrame once at the end.
+                    The columnar reader is faster and needs less memory
+                    for wide numeric results.
+    :param memo:    A switch to use the in-process memo, if activated
+                    with `set_memo()`. (optional)
+    :param prefetch:
+                    The number of chunks to fetch ahead. (optional)
+                    If greater than zero, the chunks are fetched from
+                    the database in a background thread into a bounded
+                    queue, while the date parsing, the `defaults` and
+                    the `dtype` are applied to the previous chunks.
+                    This overlaps the network latency with the conversion
+                    for large results. Ignored by the columnar reader.
+                    Defaults to 0, fetching and converting one chunk
+                    after the other.
+    :param in_batch_size:
+                    The maximum number of values in a bind parameter
+                    collection per query. (optional)
+                    A larger collection is split into batches,
+                    which are loaded in parallel and concatenated
+                    in the order of the collection.
+                    This requires a query, which selects the rows for
+                    every value independently, like ``WHERE id IN :ids``,
+                    without aggregates, ``DISTINCT``, ``ORDER BY`` or ``LIMIT``.
+                    Only one collection can exceed the batch size.
+    :param max_workers:
+                    The maximum number of batches to load in parallel.
+                    (optional)
+                    Defaults to 4.
+                    The connection pool of the engine must allow
+                    as many connections, see `get_engine()`.
+    :param max_memory:
+                    The maximum memory usage of the loaded chunks in bytes.
+                    (optional)
+                    If the budget is exceeded, the chunks loaded so far
+                    and all remaining chunks are spilled into a Parquet file
+                    as separate row groups, and a lazy
+                    `fastparquet.ParquetFile` handle is returned instead of
+                    a DataFrame, like with `stream_cache`.
+                    The chunks can be read one by one with
+                    `iter_row_groups()`.
+                    The result is spilled into the cache file, if one is used,
+                    otherwise into a temporary file, which is removed
+                    when the process exits.
+                    An existing cache file is returned as lazy handle,
+                    if its uncompressed size exceeds the budget.
     :param kwargs:  Additional named arguments
                     are passed to `sqlalchemy.sql.expression.TextClause.bindparams()`.
+                    Lists, tuples, sets, arrays and Series are expanded
+                    as IN-lists, if the query uses them with ``IN``,
+                    e.g. ``load_query("... WHERE id IN :ids", ids=[1, 2, 3])``,
+                    otherwise they are bound as they are, e.g. as arrays.
 
-    :return: Pandas DataFrame
+    :return: Pandas DataFrame,
+             or `fastparquet.ParquetFile` if `stream_cache` is set
+             or `max_memory` is exceeded
     """
+    with _instrument('load_query', query):
+        if reader not in ('pandas', 'columnar'):
+            raise ValueError("Unsupported reader: {}".format(reader))
+        memo_key = None
+        if memo and not stream_cache and _memo_max_bytes is not None:
+            memo_key = _cache_key(query, db_conn, kwargs,
+                                  date=date, defaults=defaults, dtype=dtype, index=index)
+            df = _memo_get(memo_key)
+            if df is not None:
+                return df
+        cachefile, cache_key = _resolve_cachefile(
+            query, db_conn, kwargs, cachefile, cache,
+            date=date, defaults=defaults, dtype=dtype, index=index)
+        oversized = [name for name in _in_list_names(query, kwargs)
+                     if len(kwargs[name]) > in_batch_size]
+        if len(oversized) > 1:
+            raise ValueError("Only one bind parameter collection can exceed "
+                             "the batch size: {}".format(', '.join(oversized)))
+        if oversized:
+            def iter_chunks():
+                return _iter_in_batches(
+                    query, oversized[0], in_batch_size, max_workers,
+                    db_conn=db_conn, date=date, defaults=defaults, dtype=dtype,
+                    index=index, chunksize=chunksize, reader=reader, prefetch=prefetch,
+                    **kwargs)
+        elif reader == 'columnar':
+            def iter_chunks():
+                return iter((_read_columnar(query, db_conn=db_conn,
+                                            date=date, defaults=defaults, dtype=dtype,
+                                            index=index, chunksize=chunksize, **kwargs),))
+        else:
+            def iter_chunks():
+                return iter_query(query, db_conn=db_conn,
+                                  date=date, defaults=defaults, dtype=dtype, index=index,
+                                  chunksize=chunksize, prefetch=prefetch, **kwargs)
+        result = _load_through_cache(
+            iter_chunks, cachefile, cache_key, cache_ttl=cache_ttl,
+            compress_cache=compress_cache, stream_cache=stream_cache,
+            max_memory=max_memory)
+        if memo_key:
+            result = _memo_put(memo_key, result)
+        return result
+
+
+def _iter_in_batches(query, name, batch_size, max_workers, **kwargs):
+    # splits the collection of the bind parameter `name` into batches,
+    # loads the batches in parallel and yields their DataFrames in order
+    # duplicates are dropped, otherwise rows matching a value
+    # in multiple batches would be loaded multiple times
+    values = list(dict.fromkeys(_collection_values(kwargs.pop(name))))
+    batches = [values[i:i + batch_size] for i in range(0, len(values), batch_size)]
+    with ThreadPoolExecutor(max_workers=max_workers or min(len(batches), 4)) as executor:
+        futures = [executor.submit(load_query, query, cache=False, memo=False,
+                                   **kwargs, **{name: batch})
+                   for batch in batches]
+        for future in futures:
+            yield future.result()
+
+
+class _ChunkTuner:
+    """
+    Adapts the number of rows per chunk to a target memory usage
+    and a target time to fetch and convert a chunk.
+    The memory usage per row and the time per row are measured
+    on the first chunks.
+    """
+
+    target_bytes = 8 * 1024 * 1024
+    target_seconds = 0.25
+    initial_size = 1024
+    min_size = 64
+    max_size = 1024 * 1024
+    max_growth = 4
+    calibration_chunks = 4
+
+    def __init__(self):
+        self.size = self.initial_size
+        self.observed = 0
+        self.fetch_seconds = 0.0
+
+    def iter_chunks(self, result):
+        columns = list(result.keys())
+        record = _current_record()
+        empty = True
+        while True:
+            if record is not None:
+                if record['chunksizes'] is None:
+                    record['chunksizes'] = []
+                record['chunksizes'].append(self.size)
+            start = time.perf_counter()
+            rows = result.fetchmany(self.size)
+            if not rows:
+                break
+            df = pd.DataFrame.from_records(list(map(tuple, rows)),
+                                           columns=columns, coerce_float=True)
+            self.fetch_seconds = time.perf_counter() - start
+            empty = False
+            yield df
+        if record is not None:
+            # the last size returned no rows
+            record['chunksizes'].pop()
+        if empty:
+            yield pd.DataFrame(columns=columns)
+
+    def observe(self, chunk, convert_seconds):
+        if self.observed >= self.calibration_chunks or not len(chunk):
+            return
+        self.observed += 1
+        rows = len(chunk)
+        bytes_per_row = max(chunk.memory_usage(deep=True).sum() / rows, 1.0)
+        seconds_per_row = max((self.fetch_seconds + convert_seconds) / rows, 1e-9)
+        size = min(self.target_bytes / bytes_per_row, self.target_seconds / seconds_per_row)
+        self.size = int(min(max(size, self.min_size), self.max_size,
+                            self.size * self.max_growth))
+
+
+class _ColumnBuffer:
+    """
+    A growable NumPy array for the values of one result column.
+    The data type is inferred from the first values
+    and widened if later values do not fit.
+    """
+
+    def __init__(self, capacity):
+        self.data = None
+        self.capacity = capacity
+        self.size = 0
+
+    @staticmethod
+    def _infer_dtype(values):
+        # returns None if all values are NULL
+        kinds = set(type(v) for v in values if v is not None)
+        if not kinds:
+            return None
+        nulls = any(v is None for v in values)
+        if kinds <= {bool}:
+            return np.dtype(object) if nulls else np.dtype(bool)
+        if kinds <= {int}:
+            return np.dtype(np.float64) if nulls else np.dtype(np.int64)
+        if kinds <= {int, float}:
+            return np.dtype(np.float64)
+        return np.dtype(object)
+
+    @staticmethod
+    def _widen(dtype, batch_dtype):
+        # returns a data type for the values of the buffer and of the batch
+        if batch_dtype is None:
+            if dtype == np.int64:
+                return np.dtype(np.float64)
+            if dtype == bool:
+                return np.dtype(object)
+            return dtype
+        if dtype == batch_dtype:
+            return dtype
+        if {dtype, batch_dtype} <= {np.dtype(np.int64), np.dtype(np.float64)}:
+            return np.dtype(np.float64)
+        return np.dtype(object)
+
+    def _convert(self, values):
+        batch_dtype = self._infer_dtype(values)
+        if self.data is None:
+            dtype = batch_dtype if batch_dtype is not None else np.dtype(object)
+            self.data = np.empty(self.capacity, dtype=dtype)
+        else:
+            dtype = self._widen(self.data.dtype, batch_dtype)
+            if dtype != self.data.dtype:
+                self.data = self.data.astype(dtype)
+        try:
+            return np.asarray(values, dtype=dtype)
+        except OverflowError:
+            # integers beyond 64 bit
+            self.data = self.data.astype(object)
+            return np.asarray(values, dtype=object)
+
+    def append(self, values):
+        converted = self._convert(values)
+        n = len(converted)
+        if self.size + n > self.capacity:
+            while self.size + n > self.capacity:
+                self.capacity *= 2
+            data = np.empty(self.capacity, dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+        self.data[self.size:self.size + n] = converted
+        self.size += n
+
+    def values(self):
+        if self.data is None:
+            return np.empty(0, dtype=object)
+        return self.data[:self.size]
+
+
+def _read_columnar(query, db_conn=None,
+                   date=None, defaults=None, dtype=None, index=None,
+                   chunksize=4096, **kwargs):
+    # reads the result of the query with fetchmany() into column buffers
+    # and builds one DataFrame without concatenating chunks
+    if isinstance(chunksize, str) and chunksize == 'auto':
+        chunksize = 4096
+    with _connect(db_conn, stream_results=True) as conn:
+        result = conn.execute(_text(query, kwargs))
+        columns = list(result.keys())
+        buffers = [_ColumnBuffer(chunksize) for _ in columns]
+        for rows in _fetch(iter(lambda: result.fetchmany(chunksize) or None, None)):
+            for buffer, values in zip(buffers, zip(*rows)):
+                buffer.append(values)
+    with _phase('convert'):
+        df = pd.DataFrame({c: b.values() for c, b in zip(columns, buffers)},
+                          columns=columns, copy=False)
+        df = _chunk_processor(defaults, dtype)(_prepare_frame(df, date, index))
+    _count_chunk(df)
+    return df
+
+
+_date_units = ('D', 'd', 'h', 'm', 's', 'ms', 'us', 'ns')
+
+
+def _parse_date_column(column, fmt=None):
+    # follows the rules of `pandas.read_sql_query()`:
+    # numbers are seconds since the epoch and unparsable values become NaT
+    if isinstance(fmt, dict):
+        return pd.to_datetime(column, **fmt)
+    if fmt is None and (issubclass(column.dtype.type, np.floating) or
+                        issubclass(column.dtype.type, np.integer)):
+        fmt = 's'
+    if fmt in _date_units:
+        return pd.to_datetime(column, errors='coerce', unit=fmt)
+    if isinstance(column.dtype, pd.DatetimeTZDtype):
+        return pd.to_datetime(column, utc=True)
+    return pd.to_datetime(column, errors='coerce', format=fmt)
+
+
+def _prepare_frame(df, date=None, index=None):
+    # parses date columns and sets the index like `pandas.read_sql_query()`
+    if type(date) is str:
+        date = (date,)
+    if isinstance(date, dict):
+        for column, fmt in date.items():
+            df[column] = _parse_date_column(df[column], fmt)
+    elif date:
+        for column in date:
+            df[column] = _parse_date_column(df[column])
+    for column in df.columns[df.dtypes.map(
+            lambda t: isinstance(t, pd.DatetimeTZDtype))]:
+        df[column] = df[column].dt.tz_convert('UTC')
+    if index is not None:
+        df.set_index(index if type(index) is str else list(index), inplace=True)
+    return df
+
+
+def _resolve_cachefile(query, db_conn, bindparams, cachefile, cache, **options):
+    # returns the cache file to use and the key for the managed cache,
+    # if the cache file is located in the managed cache directory
+    if not cachefile and cache and _cache_dir:
+        cache_key = _cache_key(query, db_conn, bindparams, **options)
+        return _managed_cachefile(cache_key), cache_key
+    return cachefile, None
+
+
+def _load_through_cache(iter_chunks, cachefile, cache_key, cache_ttl=None,
+                        compress_cache=False, stream_cache=False, max_memory=None):
+    # reads the result from the cache file if it exists,
+    # otherwise concatenates or streams the chunks from `iter_chunks()`
+    # and writes them into the cache file;
+    # spills the chunks into the cache file or a temporary file
+    # if they exceed `max_memory`
+    if stream_cache and not cachefile:
+        raise ValueError("Streaming into the cache requires a cache file.")
     if cachefile:
         if not os.path.isdir(os.path.dirname(cachefile)):
             raise FileNotFoundError("The parent directory for the cache file does not exist.")
         try:
-            return read_cachefile(cachefile)
+            with _phase('cache_read'):
+                if stream_cache:
+                    result = open_cachefile(cachefile)
+                elif max_memory is not None:
+                    # keep the lazy handle if the uncompressed size of the
+                    # cache file exceeds the budget
+                    result = open_cachefile(cachefile)
+                    if sum(rg.total_byte_size for rg in result.row_groups) <= max_memory:
+                        result = result.to_pandas()
+                else:
+                    result = read_cachefile(cachefile)
+            record = _current_record()
+            if record is not None:
+                record['cache_hit'] = True
+            return result
         except FileNotFoundError:
             pass
 
-    if type(date) is str:
-        date = (date,)
-
-    def process_chunk(c):
-        if defaults:
-            c.fillna(defaults, inplace=True, downcast=dtype)
-        if dtype:
-            c = c.astype(dtype, copy=False)
-        return c
+    if stream_cache:
+        _write_cachefile_chunks(iter_chunks(), cachefile, compress=compress_cache)
+        if cache_key:
+            _register_managed_cachefile(
+                cache_key, cache_ttl if cache_ttl is not None else _cache_ttl)
+        return open_cachefile(cachefile)
 
-    engine = create_engine(db_conn or _def_db_conn)
-    try:
-        with engine.connect().execution_options(stream_results=True) as conn:
-            chunks = list(map(
-                process_chunk,
-                pd.read_sql_query(text(query).bindparams(**kwargs),
-                                  conn,
-                                  index_col=index,
-                                  parse_dates=date,
-                                  chunksize=chunksize)))
-    finally:
-        engine.dispose()
-    df = pd.concat(chunks)
+    if max_memory is None:
+        chunks = list(iter_chunks())
+    else:
+        chunks = []
+        size = 0
+        remaining = iter(iter_chunks())
+        for chunk in remaining:
+            chunks.append(chunk)
+            size += _chunk_memory_usage(chunk)
+            if size > max_memory:
+                return _spill_chunks(chunks, remaining, cachefile, cache_key,
+                                     cache_ttl=cache_ttl, compress_cache=compress_cache)
+    with _phase('concat'):
+        df = _concat_chunks(chunks)
 
     if cachefile:
-        write_cachefile(df, cachefile, compress=compress_cache)
+        with _phase('cache_write'):
+            write_cachefile(df, cachefile, compress=compress_cache)
+        if cache_key:
+            _register_managed_cachefile(
+                cache_key, cache_ttl if cache_ttl is not None else _cache_ttl)
 
     return df
 
 
+def _spill_chunks(chunks, remaining, cachefile, cache_key, cache_ttl=None,
+                  compress_cache=False):
+    # writes the loaded and the remaining chunks into the cache file
+    # or a temporary file and releases the loaded chunks while writing
+    def drain():
+        while chunks:
+            yield chunks.pop(0)
+        yield from remaining
+
+    record = _current_record()
+    if record is not None:
+        record['spilled'] = True
+    spill_file = cachefile or _spill_file()
+    _write_cachefile_chunks(drain(), spill_file, compress=compress_cache)
+    if cache_key:
+        _register_managed_cachefile(
+            cache_key, cache_ttl if cache_ttl is not None else _cache_ttl)
+    return open_cachefile(spill_file)
+
+
+def _write_cachefile_chunks(chunks, cachefile, compress=False):
+    # write into a temporary file first, to prevent an incomplete
+    # cache file from being used after a failed query
+    tmp_file = cachefile + '.part'
+    empty = True
+    try:
+        for chunk in chunks:
+            with _phase('cache_write'):
+                write_cachefile(chunk, tmp_file, compress=compress, append=not empty)
+            empty = False
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    if empty:
+        raise ValueError("The query returned no chunks to write into the cache file.")
+    os.replace(tmp_file, cachefile)
+
+
 def load_scalar(query, db_conn=None, **kwargs):
     """
     Load a single scalar from an arbitrary SQL query.
@@ -136,19 +1353,34 @@ def load_scalar(query, db_conn=None, **kwargs):
 
     :return: A single value
     """
-    engine = create_engine(db_conn or _def_db_conn)
-    try:
-        with engine.connect().execution_options(stream_results=True) as conn:
-            return conn.execute(text(query).bindparams(**kwargs)).scalar()
-    finally:
-        engine.dispose()
+    with _instrument('load_scalar', query), _connect(db_conn, stream_results=True) as conn:
+        return conn.execute(_text(query, kwargs)).scalar()
 
 
-def _select_query(table_name, columns=None, where=None, group_by=None, limit=None):
-    if columns:
-        column_list = ', '.join(columns)
-    else:
-        column_list = '*'
+def load_scalars(queries, db_conn=None):
+    """
+    Load a single scalar from each of multiple SQL queries,
+    using one connection.
+
+    :param queries: An iterable with queries.
+                    A query is a string, or a pair with a string
+                    and a dict with bind parameters.
+    :param db_conn: A SqlAlchemy connection string. (optional)
+
+    :return: A list with one value per query.
+    """
+    with _instrument('load_scalars', None), _connect(db_conn) as conn:
+        return [conn.execute(query, params).scalar()
+                for query, params in _statements(queries)]
+
+
+def _select_query(table_name, columns=None, where=None, group_by=None, limit=None,
+                  order_by=None, aggregates=None, table_sample=None):
+    column_list = list(columns) if columns else []
+    if aggregates:
+        column_list.extend('{} AS {}'.format(expression, alias)
+                           for alias, expression in aggregates.items())
+    column_list = ', '.join(column_list) or '*'
 
     if type(where) is str:
         where_clause = where
@@ -170,6 +1402,15 @@ def _select_query(table_name, columns=None, where=None, group_by=None, limit=Non
     if group_by_clause:
         group_by_clause = ' GROUP BY ' + group_by_clause
 
+    if type(order_by) is str:
+        order_by_clause = order_by
+    elif order_by:
+        order_by_clause = ', '.join(order_by)
+    else:
+        order_by_clause = ''
+    if order_by_clause:
+        order_by_clause = ' ORDER BY ' + order_by_clause
+
     if limit:
         if not isinstance(limit, str) and isinstance(limit, Iterable):
             limit_clause = ' LIMIT ' \
@@ -180,13 +1421,82 @@ def _select_query(table_name, columns=None, where=None, group_by=None, limit=Non
     else:
         limit_clause = ''
 
-    return "SELECT {} FROM `{}`{}{}{} ;".format(
-        column_list, table_name, where_clause, group_by_clause, limit_clause)
+    table_sample_clause = ' ' + table_sample if table_sample else ''
+
+    return "SELECT {} FROM `{}`{}{}{}{}{} ;".format(
+        column_list, table_name, table_sample_clause, where_clause, group_by_clause,
+        order_by_clause, limit_clause)
+
+
+def _sqlite_hash_expression(seed):
+    # mixes the rowid and the seed into a value between 0 and 2**31 - 1
+    # by a multiplication, a xorshift and a second multiplication;
+    # SQLite has no XOR operator, so a ^ b is computed as (a | b) - (a & b),
+    # and all intermediate values stay below 2**63
+    mixed = '((ABS(rowid) % 2147483648) * 1103515245 + {} * 2654435761 + 12345)' \
+            ' % 2147483648'.format(seed)
+    shifted = '(({0}) >> 16)'.format(mixed)
+    xor = '((({0}) | {1}) - (({0}) & {1}))'.format(mixed, shifted)
+    return '({} * 1597334677) % 2147483648'.format(xor)
+
+
+def _sample_clauses(dialect, sample, random_state=None):
+    # returns a TABLESAMPLE clause, a condition, an ORDER-BY-clause and a limit
+    # to draw a random sample of rows in the database
+    if isinstance(sample, float):
+        if not 0.0 < sample <= 1.0:
+            raise ValueError("The sample fraction must be between 0 and 1.")
+        if sample == 1.0:
+            return None, None, None, None
+        fraction, count = sample, None
+    else:
+        fraction, count = None, int(sample)
+        if count < 0:
+            raise ValueError("The sample size must not be negative.")
+    seed = None if random_state is None else int(random_state) % 2147483648
+
+    if count == 0:
+        # LIMIT 0 is not portable, but an unsatisfiable condition is
+        return None, '1 = 0', None, None
+
+    if dialect == 'sqlite':
+        # RANDOM() can not be seeded, so a repeatable sample
+        # is drawn with a hash of the rowid and the seed
+        if seed is None:
+            if fraction is not None:
+                return None, 'ABS(RANDOM() % 1000000) < {}'.format(int(fraction * 1000000)), \
+                    None, None
+            return None, None, 'RANDOM()', count
+        hash_expression = _sqlite_hash_expression(seed)
+        if fraction is not None:
+            return None, '{} < {}'.format(hash_expression, int(fraction * 2147483648)), \
+                None, None
+        return None, None, hash_expression, count
+    if dialect == 'postgresql':
+        if fraction is not None:
+            table_sample = 'TABLESAMPLE BERNOULLI ({!r})'.format(fraction * 100.0)
+            if seed is not None:
+                table_sample += ' REPEATABLE ({})'.format(seed)
+            return table_sample, None, None, None
+        if seed is None:
+            return None, None, 'RANDOM()', count
+        return None, None, "MD5(CAST(ctid AS text) || ':{}')".format(seed), count
+    if dialect in ('mysql', 'mariadb'):
+        random_expression = 'RAND()' if seed is None else 'RAND({})'.format(seed)
+        if fraction is not None:
+            return None, '{} < {!r}'.format(random_expression, fraction), None, None
+        return None, None, random_expression, count
+    raise ValueError("Sampling is not supported for the database: {}".format(dialect))
 
 
 def load_table(name, columns=None, where=None, group_by=None, limit=None,
                db_conn=None, date=None, defaults=None, dtype=None, index=None,
-               chunksize=4096, cachefile=None, compress_cache=False):
+               chunksize=4096, cachefile=None, compress_cache=False,
+               stream_cache=False, cache=True, cache_ttl=None,
+               partition_column=None, partitions=None, max_workers=None,
+               incremental_column=None, cache_table=False, memo=True, prefetch=0,
+               sample=None, random_state=None, max_memory=None,
+               order_by=None, aggregates=None):
     """
     Load data from a SQL table.
 
@@ -213,12 +1523,18 @@ def load_table(name, columns=None, where=None, group_by=None, limit=None,
     :param dtype:    A dict with column names and NumPy datatypes
                      or ``'category'``. (optional)
                      See `pandas.DataFrame.astype()` for more details.
+                     If ``'auto'`` is given, compact data types are planned
+                     with `plan_dtypes()`, when the table is loaded from
+                     the database. The plan is stored in the attribute
+                     ``attrs['dtype_plan']`` of the resulting DataFrame.
     :param index:    A column name or an iterable with column names,
                      which will be the index in the resulting DataFrame.
                      (optional)
     :param chunksize:
                      The number of rows to load in a chunk before
-                     converting them into a Pandas DataFrame. (optional)
+                     converting them into a Pandas DataFrame,
+                     or ``'auto'`` to adapt the number of rows. (optional)
+                     See `load_query()` for more details.
     :param cachefile:
                      A path to a file to cache the result data from the query.
                      (optional)
@@ -226,13 +1542,1081 @@ def load_table(name, columns=None, where=None, group_by=None, limit=None,
                      instead of connecting to the database.
     :param compress_cache:
                      A switch to activate data compression for the cache file.
+    :param stream_cache:
+                     A switch to write every chunk directly into the cache file
+                     as a separate row group. (optional)
+                     See `load_query()` for more details.
+    :param cache:    A switch to use the managed cache directory,
+                     if no `cachefile` is given. (optional)
+                     See `set_cache_dir()` for more details.
+    :param cache_ttl:
+                     The time to live for a new entry in the managed cache
+                     in seconds. (optional)
+    :param partition_column:
+                     A column name to split the table into ranges,
+                     which are loaded in parallel. (optional)
+                     Can not be combined with `group_by`, `limit`,
+                     `order_by` or `aggregates`.
+                     Rows with `NULL` in this column are loaded
+                     with the first partition.
+    :param partitions:
+                     The number of partitions or an iterable with the
+                     boundaries between the partitions. (optional)
+                     If a number is given, the range between the minimum
+                     and the maximum value of `partition_column`
+                     is split into equally sized ranges.
+                     This requires a numeric or datetime column.
+                     Defaults to 4.
+    :param max_workers:
+                     The maximum number of partitions to load in parallel.
+                     (optional)
+                     Defaults to the number of partitions.
+                     The connection pool of the engine must allow
+                     as many connections, see `get_engine()`.
+    :param incremental_column:
+                     A column name with monotonically increasing values,
+                     like an ID or a timestamp, to update the cache file
+                     incrementally. (optional)
+                     If the cache file exists, only the rows with values
+                     greater than the maximum value in the cache file
+                     are loaded and appended to the cache file
+                     as a new row group.
+                     Requires `cachefile` or a managed cache directory
+                     and can not be combined with `group_by`, `limit`,
+                     `order_by` or `aggregates`.
+    :param cache_table:
+                     A switch to cache the complete table with all columns
+                     and rows, and to serve `columns` and `where` from the
+                     cache file. (optional)
+                     Only the requested columns are read from the cache file,
+                     and row groups which can not match the conditions are
+                     skipped according to their statistics.
+                     Every chunk becomes a row group in the cache file.
+                     The conditions in `where` must be simple comparisons
+                     of a column with a number or a quoted string,
+                     like ``"Total >= 5"`` or ``"Country = 'USA'"``,
+                     and the literals must fit the types of the columns,
+                     otherwise the rows are loaded from the database directly.
+                     Requires `cachefile` or a managed cache directory
+                     and can not be combined with `group_by`, `limit`,
+                     `order_by`, `aggregates` or `stream_cache`.
+    :param memo:     A switch to use the in-process memo, if activated
+                     with `set_memo()`. (optional)
+    :param prefetch: The number of chunks to fetch ahead in a background
+                     thread, while the current chunk is converted. (optional)
+                     See `load_query()` for more details.
+    :param sample:   A float between 0 and 1 as the fraction of rows,
+                     or an integer as the number of rows,
+                     to draw as a random sample in the database. (optional)
+                     Only the sampled rows are transferred.
+                     A fraction is drawn with ``TABLESAMPLE BERNOULLI``
+                     in PostgreSQL and with a random filter in SQLite and MySQL,
+                     so the number of rows varies slightly.
+                     A number of rows is drawn by ordering the rows randomly
+                     and can not be combined with `group_by`, `limit`,
+                     `order_by` or `aggregates`.
+                     Can not be combined with `partition_column`,
+                     `incremental_column` or `cache_table`.
+                     Supports SQLite, PostgreSQL and MySQL.
+    :param random_state:
+                     An integer as seed for a repeatable sample. (optional)
+                     In SQLite a repeatable sample is drawn by hashing
+                     the ``rowid``.
+                     Without a seed, every call draws a new sample,
+                     so the sample is not stored in the managed cache
+                     or in the in-process memo.
+    :param max_memory:
+                     The maximum memory usage of the loaded chunks in bytes.
+                     (optional)
+                     See `load_query()` for more details.
+    :param order_by: A string as an ORDER-BY-clause or an iterable with
+                     multiple ORDER-BY-clauses. (optional)
+    :param aggregates:
+                     A dict with column aliases and SQL expressions,
+                     e.g. ``{'n': 'COUNT(*)', 'total': 'SUM(Total)'}``,
+                     which are appended to the selected columns. (optional)
+                     Usually combined with `group_by`.
+
+    :return: Pandas DataFrame,
+             or `fastparquet.ParquetFile` if `stream_cache` is set
+             or `max_memory` is exceeded
+    """
+    with _instrument('load_table', name):
+        table_sample = None
+        if sample is not None:
+            if partition_column or incremental_column or cache_table:
+                raise ValueError("Sampling can not be combined with partition_column, "
+                                 "incremental_column or cache_table.")
+            table_sample, sample_where, sample_order_by, sample_limit = _sample_clauses(
+                get_engine(db_conn).dialect.name, sample, random_state)
+            if sample_limit is not None:
+                if group_by or limit or order_by or aggregates:
+                    raise ValueError("Sampling a number of rows can not be combined "
+                                     "with group_by, limit, order_by or aggregates.")
+                order_by, limit = sample_order_by, sample_limit
+            if sample_where:
+                where = _conjunction(where, sample_where)
+            if random_state is None:
+                cache = False
+                memo = False
+        sql_query = _select_query(name,
+                                  columns=columns, where=where,
+                                  group_by=group_by, limit=limit,
+                                  order_by=order_by, aggregates=aggregates,
+                                  table_sample=table_sample)
+        auto_dtype = isinstance(dtype, str) and dtype == 'auto'
+        if cache_table:
+            if group_by or limit or order_by or aggregates or stream_cache:
+                raise ValueError("Serving from a cached table can not be combined "
+                                 "with group_by, limit, order_by, aggregates "
+                                 "or stream_cache.")
+            predicates = _parse_predicates(where)
+            if predicates is None:
+                # the conditions can not be evaluated on the cached table
+                cache_table = False
+                cache = False
+                cachefile = None
+        if not partition_column and not incremental_column and not auto_dtype \
+                and not cache_table:
+            return load_query(sql_query, db_conn=db_conn,
+                              date=date, defaults=defaults, dtype=dtype, index=index,
+                              chunksize=chunksize, cachefile=cachefile,
+                              compress_cache=compress_cache, stream_cache=stream_cache,
+                              cache=cache, cache_ttl=cache_ttl, memo=memo,
+                              prefetch=prefetch, max_memory=max_memory)
+
+        memo_key = None
+        if memo and not stream_cache and not incremental_column \
+                and _memo_max_bytes is not None:
+            memo_key = _cache_key(sql_query, db_conn, {},
+                                  date=date, defaults=defaults, dtype=dtype, index=index)
+            df = _memo_get(memo_key)
+            if df is not None:
+                return df
+
+        if (partition_column or incremental_column) and \
+                (group_by or limit or order_by or aggregates):
+            raise ValueError("Partitioned or incremental loading can not be combined "
+                             "with group_by, limit, order_by or aggregates.")
+        if cache_table:
+            # load and cache the complete table and apply the
+            # projection and the conditions when reading the cache file
+            requested_columns, columns, where = columns, None, None
+            table_query, sql_query = sql_query, _select_query(name)
+            stream_cache = True
+        cachefile, cache_key = _resolve_cachefile(
+            sql_query, db_conn, {}, cachefile, cache,
+            date=date, defaults=defaults, dtype=dtype, index=index)
+        if cache_table and not cachefile:
+            raise ValueError("Serving from a cached table requires a cache file.")
+
+        plan = []
+
+        def resolve_dtype():
+            # plans the data types only if the table is loaded from the database
+            if not auto_dtype:
+                return dtype
+            if not plan:
+                plan.append(plan_dtypes(name, columns=columns, where=where, db_conn=db_conn))
+            return plan[0]
+
+        if partition_column:
+            def iter_chunks():
+                return _iter_partitions(
+                    name, partition_column, partitions or 4, max_workers,
+                    columns=columns, where=where, db_conn=db_conn,
+                    date=date, defaults=defaults, dtype=resolve_dtype(), index=index,
+                    chunksize=chunksize, prefetch=prefetch)
+        else:
+            def iter_chunks():
+                return iter_query(sql_query, db_conn=db_conn,
+                                  date=date, defaults=defaults, dtype=resolve_dtype(), index=index,
+                                  chunksize=chunksize, prefetch=prefetch)
+
+        if incremental_column:
+            if not cachefile:
+                raise ValueError("Incremental loading requires a cache file.")
+            if os.path.exists(cachefile):
+                high_water_mark = _cachefile_max(cachefile, incremental_column)
+                increment_query = _select_query(
+                    name, columns=columns,
+                    where=_conjunction(where, '{} > :high_water_mark'.format(incremental_column)))
+                increment = _concat_chunks(list(iter_query(
+                    increment_query, db_conn=db_conn,
+                    date=date, defaults=defaults, dtype=resolve_dtype(), index=index,
+                    chunksize=chunksize, high_water_mark=high_water_mark)))
+                if len(increment):
+                    write_cachefile(increment, cachefile, compress=compress_cache, append=True)
+                    if cache_key:
+                        _register_managed_cachefile(
+                            cache_key, cache_ttl if cache_ttl is not None else _cache_ttl)
+
+        result = _load_through_cache(
+            iter_chunks, cachefile, cache_key, cache_ttl=cache_ttl,
+            compress_cache=compress_cache, stream_cache=stream_cache,
+            max_memory=max_memory)
+        if cache_table:
+            with _phase('cache_read'):
+                result = _read_cache_table(result, cachefile, requested_columns, predicates)
+            if result is None:
+                # the database decides how to compare the literals
+                result = load_query(table_query, db_conn=db_conn,
+                                    date=date, defaults=defaults, dtype=dtype, index=index,
+                                    chunksize=chunksize, cache=False, memo=False,
+                                    prefetch=prefetch, max_memory=max_memory)
+        if plan and isinstance(result, pd.DataFrame):
+            result.attrs['dtype_plan'] = plan[0]
+        if memo_key:
+            result = _memo_put(memo_key, result)
+        return result
+
+
+_predicate_pattern = re.compile(
+    r"""^\s*[`"]?(\w+)[`"]?\s*(==|=|!=|<>|<=|>=|<|>)\s*"""
+    r"""(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|'(?:[^']|'')*')\s*$""")
+
+_predicate_operators = {
+    '=': ('==', operator.eq), '==': ('==', operator.eq),
+    '!=': ('!=', operator.ne), '<>': ('!=', operator.ne),
+    '<': ('<', operator.lt), '<=': ('<=', operator.le),
+    '>': ('>', operator.gt), '>=': ('>=', operator.ge),
+}
+
+
+def _parse_predicate(term):
+    match = _predicate_pattern.match(term)
+    if not match:
+        return None
+    column_name, op, literal = match.groups()
+    if literal.startswith("'"):
+        value = literal[1:-1].replace("''", "'")
+    elif re.match(r'^-?\d+$', literal):
+        value = int(literal)
+    else:
+        value = float(literal)
+    return column_name, op, value
+
+
+def _parse_predicates(where):
+    # parses the conditions into a conjunction of disjunctions
+    # of (column, operator, value) triples,
+    # or returns None if a condition is not a simple comparison
+    predicates = []
+    for term in _where_terms(where):
+        terms = [term] if type(term) is str else list(term)
+        disjunction = [_parse_predicate(t) for t in terms]
+        if None in disjunction:
+            return None
+        predicates.append(disjunction)
+    return predicates
+
+
+def _literal_fits(dtype, value):
+    # checks if a literal can be compared with the values of a column
+    # without depending on the type conversions of the database
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        if not isinstance(value, str):
+            return False
+        try:
+            pd.Timestamp(value)
+        except ValueError:
+            return False
+        return True
+    if pd.api.types.is_numeric_dtype(dtype):
+        return not isinstance(value, str)
+    return isinstance(value, str)
+
+
+def _read_cache_table(pf, cachefile, columns, predicates):
+    # reads the requested columns from the cache file, skips row groups
+    # by their statistics and filters the rows by the predicates,
+    # or returns None if a literal does not fit the type of its column
+    index_columns = [c if isinstance(c, str) else c.get('name')
+                     for c in (pf.pandas_metadata or {}).get('index_columns', [])]
+    dtypes = pf.dtypes
+    if not all(c in dtypes and _literal_fits(dtypes[c], v)
+               for disjunction in predicates for c, _, v in disjunction):
+        return None
+
+    def value_for(column_name, value):
+        if column_name in dtypes and pd.api.types.is_datetime64_any_dtype(dtypes[column_name]):
+            return pd.Timestamp(value)
+        return value
+
+    filters = [(c, _predicate_operators[op][0], value_for(c, v))
+               for disjunction in predicates if len(disjunction) == 1
+               for c, op, v in disjunction]
+    predicate_columns = [c for disjunction in predicates for c, _, _ in disjunction]
+    read_columns = None
+    if columns:
+        read_columns = list(columns)
+        read_columns += [c for c in predicate_columns if c not in read_columns]
+        read_columns = [c for c in read_columns if c not in index_columns]
+    df = read_cachefile(cachefile, columns=read_columns, filters=filters)
+
+    def values(column_name):
+        if column_name in df.columns:
+            return df[column_name]
+        return pd.Series(df.index.get_level_values(column_name), index=df.index)
+
+    def matches_for(s, op, v):
+        compare = _predicate_operators[op][1]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            # unordered categoricals only support equality,
+            # therefore the categories are compared and mapped by the codes,
+            # with the code -1 for NULL hitting the appended False
+            hits = compare(s.cat.categories.to_series(), v).to_numpy(dtype=bool)
+            return np.append(hits, False)[s.cat.codes.to_numpy()]
+        return (compare(s, v) & s.notna()).to_numpy()
+
+    if predicates:
+        mask = np.ones(len(df), dtype=bool)
+        for disjunction in predicates:
+            matches = np.zeros(len(df), dtype=bool)
+            for c, op, v in disjunction:
+                matches |= matches_for(values(c), op, value_for(c, v))
+            mask &= matches
+        df = df.loc[mask]
+    if columns:
+        df = df[[c for c in columns if c not in index_columns]]
+    return df
+
+
+def _cachefile_max(cachefile, column):
+    # determines the maximum value of a column in a cache file,
+    # preferably from the statistics of the row groups
+    pf = open_cachefile(cachefile)
+    try:
+        values = [v for v in pf.statistics['max'][column] if v is not None]
+    except KeyError:
+        values = None
+    if values:
+        value = max(values)
+    else:
+        value = pf.to_pandas(columns=[column], index=False)[column].max()
+    if isinstance(value, (np.datetime64, pd.Timestamp)):
+        return pd.Timestamp(value).to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class DtypePlan(dict):
+    """
+    A dict with column names and data types, created by `plan_dtypes()`.
+
+    If the plan is passed as `dtype` to `load_query()` or `load_table()`,
+    the plan records the memory usage of every chunk
+    before and after the conversion.
+
+    :ivar bytes_before: The memory usage of the loaded chunks
+                        before the conversion in bytes.
+    :ivar bytes_after:  The memory usage of the loaded chunks
+                        after the conversion in bytes,
+                        without the categories of categorical columns.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self._lock = Lock()
+
+    def __getstate__(self):
+        # the lock can not be copied, e.g. when copying `DataFrame.attrs`
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    def record(self, bytes_before, bytes_after):
+        with self._lock:
+            self.bytes_before += int(bytes_before)
+            self.bytes_after += int(bytes_after)
+
+    @property
+    def memory_saved(self):
+        """
+        The number of bytes saved by the conversion.
+        """
+        return self.bytes_before - self.bytes_after
+
+    def report(self):
+        """
+        Creates a report about the planned data types and the saved memory.
+
+        :return: A string.
+        """
+        lines = ['{}: {}'.format(c, t) for c, t in self.items()]
+        if self.bytes_before:
+            lines.append('memory: {:,} bytes -> {:,} bytes ({:.1%} saved)'.format(
+                self.bytes_before, self.bytes_after,
+                self.memory_saved / self.bytes_before))
+        return '\n'.join(lines)
+
+
+_int_dtypes = [
+    (np.int8, 'Int8'), (np.uint8, 'UInt8'),
+    (np.int16, 'Int16'), (np.uint16, 'UInt16'),
+    (np.int32, 'Int32'), (np.uint32, 'UInt32'),
+    (np.int64, 'Int64'),
+]
+
+
+def _narrowest_int_dtype(lower, upper, nullable):
+    for np_type, nullable_type in _int_dtypes:
+        info = np.iinfo(np_type)
+        if info.min <= lower and upper <= info.max:
+            return nullable_type if nullable else np.dtype(np_type).name
+    return 'Int64' if nullable else 'int64'
+
+
+def plan_dtypes(name, columns=None, where=None, db_conn=None,
+                ranges=True, categories=0.5):
+    """
+    Plan compact data types for the columns of a SQL table.
+
+    The column types are reflected from the database.
+    Integer columns get the narrowest integer type for the range
+    of their values, and nullable integer columns get a nullable
+    integer type like ``'Int32'``.
+    Boolean columns get the nullable type ``'boolean'``.
+    Single precision float columns get ``'float32'``.
+    String columns with few distinct values get ``'category'``.
+    Other columns, e.g. dates, are not part of the plan.
+
+    :param name:       The name of the table.
+    :param columns:    An iterable of column names. (optional)
+                       Defaults to all columns of the table.
+    :param where:      A string with on condition or an iterable. (optional)
+                       See `load_table()` for more details.
+                       Used to determine the value ranges.
+    :param db_conn:    A SqlAlchemy connection string. (optional)
+    :param ranges:     A switch to query the minimum and maximum value
+                       of integer columns and the number of distinct values
+                       of string columns with one aggregate query. (optional)
+                       If `False`, the plan is derived from the column types only.
+    :param categories: The maximum ratio of distinct values to rows,
+                       for a string column to become categorical. (optional)
+                       Use `None` to deactivate categorical columns.
+
+    :return: A `DtypePlan` dict with column names and data types,
+             which can be passed as `dtype` to `load_table()`.
+    """
+    engine = get_engine(db_conn)
+    reflected = inspect(engine).get_columns(name)
+    if columns:
+        selected = set(columns)
+        reflected = [c for c in reflected if c['name'] in selected]
+    # INTEGER is a 64 bit type in SQLite
+    int_bits = 64 if engine.dialect.name == 'sqlite' else 32
+
+    int_columns = []
+    str_columns = []
+    plan = DtypePlan()
+    for c in reflected:
+        t = c['type']
+        nullable = c.get('nullable', True)
+        if isinstance(t, sqltypes.Boolean):
+            plan[c['name']] = 'boolean'
+        elif isinstance(t, sqltypes.Integer):
+            if isinstance(t, sqltypes.SmallInteger):
+                plan[c['name']] = 'Int16' if nullable else 'int16'
+            elif isinstance(t, sqltypes.BigInteger) or int_bits == 64:
+                plan[c['name']] = 'Int64' if nullable else 'int64'
+            else:
+                plan[c['name']] = 'Int32' if nullable else 'int32'
+            int_columns.append((c['name'], nullable))
+        elif isinstance(t, sqltypes.Float) and t.precision and t.precision <= 24:
+            plan[c['name']] = 'float32'
+        elif isinstance(t, sqltypes.String) and categories is not None:
+            str_columns.append(c['name'])
+
+    if not ranges or not (int_columns or str_columns):
+        return plan
+    aggregates = ['COUNT(*)']
+    for c, _ in int_columns:
+        aggregates.extend(('MIN({})'.format(c), 'MAX({})'.format(c)))
+    aggregates.extend('COUNT(DISTINCT {})'.format(c) for c in str_columns)
+    with engine.connect() as conn:
+        values = list(conn.execute(text(_select_query(
+            name, columns=aggregates, where=where))).one())
+    count = values.pop(0)
+    for c, nullable in int_columns:
+        lower, upper = values.pop(0), values.pop(0)
+        if lower is not None:
+            plan[c] = _narrowest_int_dtype(lower, upper, nullable)
+    for c in str_columns:
+        distinct = values.pop(0)
+        if count and distinct / count <= categories:
+            plan[c] = 'category'
+    return plan
+
+
+def _where_terms(where):
+    if type(where) is str:
+        return [where]
+    elif where:
+        return list(where)
+    else:
+        return []
+
+
+def _conjunction(where, *terms):
+    # returns the conditions of `where` with every string condition
+    # in parentheses, so that a condition with OR can not absorb
+    # the appended terms
+    return ['({})'.format(term) if type(term) is str else term
+            for term in _where_terms(where)] + list(terms)
+
 
-    :return: Pandas DataFrame
+def _partition_boundaries(name, column, partitions, where, db_conn):
+    with get_engine(db_conn).connect() as conn:
+        lower, upper = conn.execute(text(_select_query(
+            name, columns=['MIN({})'.format(column), 'MAX({})'.format(column)],
+            where=where))).one()
+    if lower is None or lower == upper:
+        return []
+    if isinstance(lower, int) and isinstance(upper, int):
+        step = -(-(upper - lower) // partitions)
+        return list(range(lower + step, upper, step))
+    try:
+        step = (upper - lower) / partitions
+        return [lower + step * i for i in range(1, partitions)]
+    except TypeError:
+        raise TypeError("The partition column must be numeric or a datetime, "
+                        "or the partition boundaries must be given explicitly.")
+
+
+def _iter_partitions(name, column, partitions, max_workers,
+                     columns=None, where=None, db_conn=None, **kwargs):
+    # loads the partitions in parallel and yields their DataFrames in order
+    where = _conjunction(where)
+    if isinstance(partitions, int):
+        boundaries = _partition_boundaries(name, column, partitions, where, db_conn)
+    else:
+        boundaries = sorted(partitions)
+    if not boundaries:
+        yield load_query(_select_query(name, columns=columns, where=where),
+                         db_conn=db_conn, cache=False, memo=False, **kwargs)
+        return
+
+    lower_term = '{} >= :partition_lower'.format(column)
+    upper_term = '{} < :partition_upper'.format(column)
+    specs = [(where + [[upper_term, '{} IS NULL'.format(column)]],
+              {'partition_upper': boundaries[0]})]
+    for lower, upper in zip(boundaries[:-1], boundaries[1:]):
+        specs.append((where + [lower_term, upper_term],
+                      {'partition_lower': lower, 'partition_upper': upper}))
+    specs.append((where + [lower_term],
+                  {'partition_lower': boundaries[-1]}))
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(specs)) as executor:
+        futures = [executor.submit(load_query,
+                                   _select_query(name, columns=columns, where=partition_where),
+                                   db_conn=db_conn, cache=False, memo=False,
+                                   **kwargs, **bindparams)
+                   for partition_where, bindparams in specs]
+        for future in futures:
+            yield future.result()
+
+
+def iter_table(name, columns=None, where=None, group_by=None, limit=None,
+               db_conn=None, date=None, defaults=None, dtype=None, index=None,
+               chunksize=4096, prefetch=0, order_by=None, aggregates=None):
+    """
+    Load data from a SQL table chunk by chunk.
+
+    Works like `load_table()`, but yields every chunk as a separate
+    DataFrame. See `iter_query()` for more details.
+
+    :param name:     The name of the table.
+    :param columns:  An iterable of column names. (optional)
+    :param where:    A string with on condition or an iterable. (optional)
+                     See `load_table()` for more details.
+    :param group_by: A string as a GROUP-BY-clause or an iterable with
+                     multiple GROUP-BY-clauses. (optional)
+    :param limit:    The maximum number of rows,
+                     or a pair with an row offset
+                     and the maximum number of rows. (optional)
+    :param db_conn:  A SqlAlchemy connection string. (optional)
+    :param date:     A column name or an iterable with column names,
+                     or a dict with column names and date format strings,
+                     for parsing specific columns as datetimes. (optional)
+    :param defaults: A dict with column names and default values for
+                     `NULL` values. (optional)
+    :param dtype:    A dict with column names and NumPy datatypes
+                     or ``'category'``. (optional)
+    :param index:    A column name or an iterable with column names,
+                     which will be the index in the resulting DataFrames.
+                     (optional)
+    :param chunksize:
+                     The maximum number of rows in a chunk,
+                     or ``'auto'`` to adapt the number of rows. (optional)
+    :param prefetch: The number of chunks to fetch ahead in a background
+                     thread, while the current chunk is converted. (optional)
+    :param order_by: A string as an ORDER-BY-clause or an iterable with
+                     multiple ORDER-BY-clauses. (optional)
+    :param aggregates:
+                     A dict with column aliases and SQL expressions,
+                     e.g. ``{'n': 'COUNT(*)', 'total': 'SUM(Total)'}``,
+                     which are appended to the selected columns. (optional)
+                     Usually combined with `group_by`.
+
+    :return: A generator of Pandas DataFrames
     """
     sql_query = _select_query(name,
                               columns=columns, where=where,
-                              group_by=group_by, limit=limit)
-    return load_query(sql_query, db_conn=db_conn,
+                              group_by=group_by, limit=limit,
+                              order_by=order_by, aggregates=aggregates)
+    return iter_query(sql_query, db_conn=db_conn,
                       date=date, defaults=defaults, dtype=dtype, index=index,
-                      chunksize=chunksize, cachefile=cachefile,
-                      compress_cache=compress_cache)
+                      chunksize=chunksize, prefetch=prefetch)
+
+
+def iter_table_pages(name, key, columns=None, where=None, page_size=10000, after=None,
+                     db_conn=None, date=None, defaults=None, dtype=None, index=None):
+    """
+    Load data from a SQL table page by page with keyset pagination.
+
+    Every page is selected with a condition on the key of the last row
+    of the previous page, like ``WHERE key > :last_key ORDER BY key LIMIT n``,
+    instead of skipping rows with an offset.
+    Therefore, every page takes about the same time, regardless of its
+    position in the table, if the key is indexed.
+    The key of the last row of a page is stored in the attribute
+    ``attrs['last_key']`` of the page and can be passed as `after`,
+    to resume an interrupted iteration.
+
+    :param name:      The name of the table.
+    :param key:       A column name or an iterable with column names
+                      as the unique key to order the rows by.
+                      The key must not be `NULL`.
+                      A composite key is compared as a row value,
+                      which is supported by SQLite, PostgreSQL and MySQL.
+    :param columns:   An iterable of column names. (optional)
+                      The key columns are added, if they are missing.
+    :param where:     A string with on condition or an iterable. (optional)
+                      See `load_table()` for more details.
+    :param page_size: The maximum number of rows in a page. (optional)
+    :param after:     The key of the last row, which was already loaded,
+                      as a single value or a tuple for a composite key.
+                      (optional)
+                      If given, the iteration starts with the next row.
+    :param db_conn:   A SqlAlchemy connection string. (optional)
+    :param date:      A column name or an iterable with column names,
+                      or a dict with column names and date format strings,
+                      for parsing specific columns as datetimes. (optional)
+    :param defaults:  A dict with column names and default values for
+                      `NULL` values. (optional)
+    :param dtype:     A dict with column names and NumPy datatypes
+                      or ``'category'``. (optional)
+    :param index:     A column name or an iterable with column names,
+                      which will be the index in the resulting DataFrames.
+                      (optional)
+
+    :return: A generator of Pandas DataFrames
+    """
+    keys = [key] if type(key) is str else list(key)
+    if columns:
+        columns = list(columns) + [k for k in keys if k not in columns]
+    names = [':keyset_{}'.format(i) for i in range(len(keys))]
+    if len(keys) == 1:
+        key_term = '{} > {}'.format(keys[0], names[0])
+    else:
+        key_term = '({}) > ({})'.format(', '.join(keys), ', '.join(names))
+    first_query = _select_query(name, columns=columns, where=where,
+                                order_by=keys, limit=page_size)
+    next_query = _select_query(name, columns=columns,
+                               where=_conjunction(where, key_term),
+                               order_by=keys, limit=page_size)
+    process_chunk = _chunk_processor(defaults, dtype)
+
+    with _connect(db_conn) as conn:
+        first = True
+        while True:
+            if after is None:
+                statement = text(first_query)
+            else:
+                values = [after] if len(keys) == 1 else list(after)
+                statement = text(next_query).bindparams(
+                    **{n[1:]: v for n, v in zip(names, values)})
+            with _phase('fetch'):
+                page = pd.read_sql_query(statement, conn)
+            if len(page) == 0 and not first:
+                return
+            if len(page):
+                last_key = page[keys].iloc[-1].tolist()
+                next_after = last_key[0] if len(keys) == 1 else tuple(last_key)
+                if any(pd.isna(v) for v in last_key):
+                    raise ValueError("The key of the last row in a page is NULL.")
+                if after is not None and next_after == after:
+                    # stop if the key does not advance,
+                    # instead of loading the same page again
+                    return
+                after = next_after
+            with _phase('convert'):
+                page = process_chunk(_prepare_frame(page, date, index))
+            page.attrs['last_key'] = after
+            _count_chunk(page)
+            yield page
+            if len(page) < page_size:
+                return
+            first = False
+
+
+def _histogram_bin_expression(dialect, column):
+    # the index of the bin as integer, rounded down in every dialect,
+    # because casting a fraction to an integer rounds in PostgreSQL
+    ratio = '({} - :hist_lower) / :hist_width'.format(column)
+    if dialect == 'sqlite':
+        return 'CAST({} AS INTEGER)'.format(ratio)
+    if dialect == 'postgresql':
+        return 'CAST(FLOOR({}) AS INTEGER)'.format(ratio)
+    if dialect in ('mysql', 'mariadb'):
+        return 'CAST(FLOOR({}) AS SIGNED)'.format(ratio)
+    return 'FLOOR({})'.format(ratio)
+
+
+def load_histogram(name, column, bins=10, range=None, where=None, db_conn=None):
+    """
+    Compute a histogram of a numeric column in the database.
+
+    Only the counts per bin are transferred, instead of all values.
+    The result can be plotted e.g. with
+    ``plot.bar(h, value_column='count', label_column='left')``.
+
+    :param name:    The name of the table.
+    :param column:  The name of a numeric column.
+    :param bins:    The number of equally sized bins. (optional)
+    :param range:   A pair with the lower and the upper limit
+                    of the histogram. (optional)
+                    Defaults to the minimum and maximum value of the column.
+                    Values outside of the range are ignored.
+    :param where:   A string with on condition or an iterable. (optional)
+                    See `load_table()` for more details.
+    :param db_conn: A SqlAlchemy connection string. (optional)
+
+    :return: A Pandas DataFrame with one row per bin and the columns
+             ``left``, ``right`` and ``count``.
+    """
+    where = _conjunction(where)
+    if range is None:
+        with _connect(db_conn) as conn:
+            range = conn.execute(text(_select_query(
+                name, columns=['MIN({})'.format(column), 'MAX({})'.format(column)],
+                where=where))).one()
+    lower, upper = range
+    if lower is None:
+        lower, upper = 0, 1
+    width = (upper - lower) / bins or 1
+    bucket = 'CASE WHEN {} >= :hist_upper THEN {} ELSE {} END'.format(
+        column, bins - 1, _histogram_bin_expression(get_engine(db_conn).dialect.name, column))
+    counts = load_query(
+        _select_query(name, columns=[bucket + ' AS bin'], aggregates={'count': 'COUNT(*)'},
+                      where=where + ['{} >= :hist_lower'.format(column),
+                                     '{} <= :hist_upper'.format(column)],
+                      group_by='bin', order_by='bin'),
+        db_conn=db_conn, index='bin', cache=False,
+        hist_lower=lower, hist_upper=upper, hist_width=float(width))
+    # rounding errors can put values just below the upper limit into bin `bins`
+    counts = counts['count'].groupby(np.clip(counts.index.astype(int), 0, bins - 1)).sum()
+    edges = np.linspace(lower, lower + width * bins, bins + 1)
+    return pd.DataFrame(
+        {'left': edges[:-1], 'right': edges[1:],
+         'count': counts.reindex(pd.RangeIndex(bins), fill_value=0).values.astype(np.int64)},
+        index=pd.RangeIndex(bins, name='bin'))
+
+
+_time_bucket_formats = {
+    'year': '%Y-01-01 00:00:00',
+    'month': '%Y-%m-01 00:00:00',
+    'day': '%Y-%m-%d 00:00:00',
+    'hour': '%Y-%m-%d %H:00:00',
+    'minute': '%Y-%m-%d %H:%M:00',
+}
+
+
+def _time_bucket_expression(dialect, column, unit):
+    if unit not in _time_bucket_formats:
+        raise ValueError("Unsupported time unit: {}".format(unit))
+    if dialect == 'sqlite':
+        return "strftime('{}', {})".format(_time_bucket_formats[unit], column)
+    if dialect == 'postgresql':
+        return "date_trunc('{}', {})".format(unit, column)
+    if dialect in ('mysql', 'mariadb'):
+        return "DATE_FORMAT({}, '{}')".format(
+            column, _time_bucket_formats[unit].replace('%M', '%i').replace('%S', '%s'))
+    raise ValueError("Time buckets are not supported for the database: {}".format(dialect))
+
+
+def load_time_buckets(name, column, unit='day', aggregates=None, where=None,
+                      db_conn=None):
+    """
+    Aggregate the rows of a table in time buckets in the database.
+
+    Only one row per time bucket is transferred, instead of all rows.
+    The result can be plotted e.g. with ``plot.line(tb, column='count')``.
+    Supports SQLite, PostgreSQL and MySQL.
+
+    :param name:       The name of the table.
+    :param column:     The name of a date or timestamp column.
+    :param unit:       The size of the time buckets: ``'year'``,
+                       ``'month'``, ``'day'``, ``'hour'`` or ``'minute'``.
+                       (optional)
+    :param aggregates: A dict with column aliases and SQL expressions,
+                       e.g. ``{'avg_total': 'AVG(Total)'}``. (optional)
+                       Defaults to ``{'count': 'COUNT(*)'}``.
+    :param where:      A string with on condition or an iterable. (optional)
+                       See `load_table()` for more details.
+    :param db_conn:    A SqlAlchemy connection string. (optional)
+
+    :return: A Pandas DataFrame with the start of the time buckets as index
+             and one column per aggregate.
+    """
+    bucket = _time_bucket_expression(get_engine(db_conn).dialect.name, column, unit)
+    return load_query(
+        _select_query(name, columns=[bucket + ' AS bucket'],
+                      aggregates=aggregates or {'count': 'COUNT(*)'},
+                      where=_conjunction(where, '{} IS NOT NULL'.format(column)),
+                      group_by='bucket', order_by='bucket'),
+        db_conn=db_conn, date='bucket', index='bucket', cache=False)
+
+
+class QueryResults(dict):
+    """
+    A dict with the DataFrames loaded by `load_queries()`,
+    which additionally provides the duration of every query.
+
+    :ivar timings: A dict with the names of the queries
+                   and the duration of every query in seconds.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timings = dict()
+
+
+def load_queries(specs, max_workers=None, db_conn=None):
+    """
+    Load multiple independent results concurrently.
+
+    Every spec is loaded by `load_query()` or `load_table()`
+    on a thread pool, using connections from the pooled engine.
+    The connection pool of the engine should allow
+    as many connections as workers, see `get_engine()`.
+
+    :param specs:       A dict with names and specs.
+                        A spec is either a string with a SQL query,
+                        or a dict with named arguments for `load_query()`,
+                        or a dict with the key ``'table'`` and named arguments
+                        for `load_table()` instead.
+                        The options of a spec, like `cachefile`,
+                        `dtype` or `date` are honoured.
+    :param max_workers: The maximum number of queries to run in parallel.
+                        (optional)
+    :param db_conn:     A SqlAlchemy connection string, used for all specs
+                        without their own `db_conn`. (optional)
+
+    :return: A `QueryResults` dict with the names and the DataFrames.
+    """
+    def run(spec):
+        if type(spec) is str:
+            spec = {'query': spec}
+        spec = dict(spec)
+        spec.setdefault('db_conn', db_conn)
+        start = time.perf_counter()
+        if 'table' in spec:
+            df = load_table(spec.pop('table'), **spec)
+        else:
+            df = load_query(spec.pop('query'), **spec)
+        return df, time.perf_counter() - start
+
+    results = QueryResults()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(name, executor.submit(run, spec)) for name, spec in specs.items()]
+        for name, future in futures:
+            results[name], results.timings[name] = future.result()
+    return results
+
+
+def _write_rows(data, index, columns):
+    # converts a DataFrame into a list of dicts with Python values
+    # and None for missing values
+    if index:
+        data = data.reset_index()
+    if columns:
+        data = data[list(columns)]
+    column_names = list(data.columns)
+    values = []
+    for c in column_names:
+        series = data[c]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            v = np.array(series.dt.to_pydatetime(), dtype=object)
+        else:
+            v = series.to_numpy(dtype=object)
+        v[series.isna().to_numpy()] = None
+        values.append(v.tolist())
+    return column_names, [dict(zip(column_names, row)) for row in zip(*values)]
+
+
+def _multi_values_statement(dialect, name, column_names, count, prefix=None):
+    quote = dialect.identifier_preparer.quote
+    return text('INSERT {}INTO {} ({}) VALUES {}'.format(
+        prefix + ' ' if prefix else '',
+        quote(name),
+        ', '.join(map(quote, column_names)),
+        ', '.join('(' + ', '.join(':p{}_{}'.format(j, i) for i in range(len(column_names))) + ')'
+                  for j in range(count))))
+
+
+def _write_batches(conn, statement, rows, chunksize, multi_values=False,
+                   name=None, column_names=None, prefix=None):
+    # executes the statement with executemany() for every batch, or
+    # sends every batch as one INSERT statement with multiple VALUES rows
+    dialect = conn.dialect
+    if multi_values and dialect.name == 'sqlite':
+        # SQLite limits the number of bound variables per statement
+        chunksize = max(1, min(chunksize, 32766 // max(1, len(column_names))))
+    multi_statement = None
+    for start in range(0, len(rows), chunksize):
+        batch = rows[start:start + chunksize]
+        if not multi_values:
+            conn.execute(statement, batch)
+            continue
+        if multi_statement is None or len(batch) != chunksize:
+            multi_statement = _multi_values_statement(
+                dialect, name, column_names, len(batch), prefix=prefix)
+        conn.execute(multi_statement, {
+            'p{}_{}'.format(j, i): row[c]
+            for j, row in enumerate(batch)
+            for i, c in enumerate(column_names)})
+
+
+def write_table(data: pd.DataFrame, name, db_conn=None, columns=None, index=False,
+                chunksize=1000, multi_values=False):
+    """
+    Insert the rows of a DataFrame into an existing SQL table.
+
+    The rows are inserted in batches inside of one transaction.
+    Every batch is executed with `executemany()`,
+    or optionally sent as one ``INSERT`` statement
+    with multiple ``VALUES`` rows.
+    To create a new table from a DataFrame,
+    see `pandas.DataFrame.to_sql()`.
+
+    :param data:     A Pandas DataFrame.
+    :param name:     The name of the table.
+    :param db_conn:  A SqlAlchemy connection string. (optional)
+    :param columns:  An iterable with the column names to write. (optional)
+                     Defaults to all columns of the DataFrame.
+    :param index:    A switch to write the index of the DataFrame
+                     as columns. (optional)
+    :param chunksize:
+                     The number of rows per batch. (optional)
+    :param multi_values:
+                     A switch to send batches as multi-row ``VALUES``
+                     statements. (optional)
+                     Can be faster for database drivers,
+                     which execute `executemany()` row by row.
+
+    :return: A `WriteStats` tuple with the number of rows
+             and the rows per second.
+    """
+    start = time.perf_counter()
+    column_names, rows = _write_rows(data, index, columns)
+    target = table(name, *map(column, column_names))
+    with get_engine(db_conn).begin() as conn:
+        _write_batches(conn, insert(target), rows, chunksize, multi_values,
+                       name=name, column_names=column_names)
+    return _write_stats(len(rows), start)
+
+
+def upsert_table(data: pd.DataFrame, name, keys, db_conn=None, columns=None, index=False,
+                 chunksize=1000, multi_values=False):
+    """
+    Insert or replace the rows of a DataFrame in an existing SQL table.
+
+    Rows with the same values in the key columns as existing rows
+    replace the existing rows.
+    All rows are written in batches inside of one transaction.
+    SQLite uses ``INSERT OR REPLACE``,
+    PostgreSQL uses ``INSERT ... ON CONFLICT DO UPDATE`` and
+    MySQL uses ``INSERT ... ON DUPLICATE KEY UPDATE``.
+    For these databases the key columns must have a unique constraint.
+    For other databases, the existing rows are deleted before
+    the new rows are inserted.
+
+    :param data:     A Pandas DataFrame.
+    :param name:     The name of the table.
+    :param keys:     A column name or an iterable with column names,
+                     identifying a row.
+    :param db_conn:  A SqlAlchemy connection string. (optional)
+    :param columns:  An iterable with the column names to write. (optional)
+                     Defaults to all columns of the DataFrame.
+    :param index:    A switch to write the index of the DataFrame
+                     as columns. (optional)
+    :param chunksize:
+                     The number of rows per batch. (optional)
+    :param multi_values:
+                     A switch to send batches as multi-row ``VALUES``
+                     statements. (optional)
+                     Can be faster for database drivers,
+                     which execute `executemany()` row by row.
+
+    :return: A `WriteStats` tuple with the number of rows
+             and the rows per second.
+    """
+    start = time.perf_counter()
+    if type(keys) is str:
+        keys = (keys,)
+    column_names, rows = _write_rows(data, index, columns)
+    missing = [k for k in keys if k not in column_names]
+    if missing:
+        raise KeyError("The key columns are not written: {}".format(', '.join(missing)))
+    engine = get_engine(db_conn)
+    dialect = engine.dialect
+    target = table(name, *map(column, column_names))
+    values = [c for c in column_names if c not in keys]
+    prefix = None
+
+    with engine.begin() as conn:
+        if dialect.name == 'sqlite':
+            prefix = 'OR REPLACE'
+            statement = insert(target).prefix_with(prefix)
+        elif dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as pg_insert
+            statement = pg_insert(target)
+            if values:
+                statement = statement.on_conflict_do_update(
+                    index_elements=list(keys),
+                    set_={c: statement.excluded[c] for c in values})
+            else:
+                statement = statement.on_conflict_do_nothing(index_elements=list(keys))
+            multi_values = False
+        elif dialect.name in ('mysql', 'mariadb'):
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+            statement = mysql_insert(target)
+            statement = statement.on_duplicate_key_update(
+                {c: statement.inserted[c] for c in (values or keys)})
+            # the ON CONFLICT and ON DUPLICATE KEY clauses
+            # are not supported by the multi-row VALUES statement
+            multi_values = False
+        else:
+            conn.execute(
+                delete(target).where(and_(*(target.c[k] == bindparam(k) for k in keys))),
+                [{k: row[k] for k in keys} for row in rows])
+            statement = insert(target)
+        _write_batches(conn, statement, rows, chunksize, multi_values,
+                       name=name, column_names=column_names, prefix=prefix)
+    return _write_stats(len(rows), start)
+
+
+def _write_stats(rows, start):
+    seconds = time.perf_counter() - start
+    return WriteStats(rows, seconds, rows / seconds if seconds > 0 else float('inf'))
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains asyncio counterparts of the functions
+in `mastersign.datascience.database`.
+
+The functions are built on the asyncio extension of SqlAlchemy
+and require a connection string with an async driver,
+e.g. ``sqlite+aiosqlite:///demo-data/chinook.db``
+with the package *aiosqlite* installed.
+Multiple queries can run concurrently on one event loop,
+e.g. with `asyncio.gather()`.
+"""
+
+import os
+import asyncio
+from threading import Lock
+import pandas as pd
+from sqlalchemy.ext.asyncio import create_async_engine
+from . import _chunk_processor, _concat_chunks, _prepare_frame, _resolve_cachefile, \
+    _register_managed_cachefile, _select_query, _text, read_cachefile, write_cachefile
+from .. import database as _db
+
+_def_db_conn = None
+
+_engines = dict()
+_engines_lock = Lock()
+
+
+def set_default_db_conn(db_conn):
+    """
+    Sets the default connection string for subsequent async database queries.
+
+    :param db_conn: A SqlAlchemy connection string with an async driver.
+    """
+    global _def_db_conn
+    _def_db_conn = db_conn
+
+
+def get_engine(db_conn=None, pool_size=None, max_overflow=None):
+    """
+    Get a pooled async SqlAlchemy engine from the process-wide
+    registry of async engines.
+
+    See `mastersign.datascience.database.get_engine()` for more details.
+
+    :param db_conn:      A SqlAlchemy connection string
+                         with an async driver. (optional)
+    :param pool_size:    The number of connections to keep open
+                         in the connection pool. (optional)
+    :param max_overflow: The number of connections to allow in excess
+                         of `pool_size`. (optional)
+
+    :return: A SqlAlchemy `AsyncEngine`
+    """
+    db_conn = db_conn or _def_db_conn
+    if db_conn is None:
+        raise ValueError("No connection string given and no default connection set.")
+    options = dict()
+    if pool_size is not None:
+        options['pool_size'] = pool_size
+    if max_overflow is not None:
+        options['max_overflow'] = max_overflow
+    with _engines_lock:
+        entry = _engines.get(db_conn)
+        if entry is not None:
+            engine, engine_options = entry
+            if not options or options == engine_options:
+                return engine
+            engine.sync_engine.dispose()
+        engine = create_async_engine(db_conn, **options)
+        _engines[db_conn] = (engine, options)
+        return engine
+
+
+async def dispose_engines():
+    """
+    Dispose all async engines in the registry and close
+    their pooled connections.
+    """
+    with _engines_lock:
+        engines = [engine for engine, _ in _engines.values()]
+        _engines.clear()
+    for engine in engines:
+        await engine.dispose()
+
+
+async def execute(sql, db_conn=None, **kwargs):
+    """
+    Execute a SQL statement, returning no data.
+
+    :param sql:     A string as a SQL statement.
+    :param db_conn: A SqlAlchemy connection string with an async driver.
+                    (optional)
+    :param kwargs:  Additional named arguments,
+                    passed to `sqlalchemy.sql.expression.TextClause.bindparams()`.
+    """
+    async with get_engine(db_conn).connect() as conn:
+        await conn.execute(_text(sql, kwargs))
+        await conn.commit()
+
+
+def _check_chunksize(chunksize):
+    if isinstance(chunksize, str):
+        raise ValueError("The async functions require a fixed number of rows per chunk, "
+                         "'{}' is not supported.".format(chunksize))
+
+
+async def iter_query(query, db_conn=None,
+                     date=None, defaults=None, dtype=None, index=None,
+                     chunksize=4096, **kwargs):
+    """
+    Load data from an arbitrary SQL query chunk by chunk.
+
+    An async generator, yielding every chunk as a separate DataFrame.
+    See `mastersign.datascience.database.iter_query()` for a description
+    of the parameters.
+    The `chunksize` must be a number of rows, ``'auto'`` is not supported.
+
+    :return: An async generator of Pandas DataFrames
+    """
+    _check_chunksize(chunksize)
+    process_chunk = _chunk_processor(defaults, dtype)
+    async with get_engine(db_conn).connect() as conn:
+        result = await conn.stream(_text(query, kwargs))
+        columns = list(result.keys())
+        empty = True
+        async for rows in result.partitions(chunksize):
+            empty = False
+            df = pd.DataFrame.from_records(list(map(tuple, rows)),
+                                           columns=columns, coerce_float=True)
+            yield process_chunk(_prepare_frame(df, date, index))
+        if empty:
+            yield process_chunk(_prepare_frame(pd.DataFrame(columns=columns), date, index))
+
+
+async def load_query(query, db_conn=None,
+                     date=None, defaults=None, dtype=None, index=None,
+                     chunksize=4096, cachefile=None, compress_cache=False,
+                     cache=True, cache_ttl=None,
+                     **kwargs):
+    """
+    Load data from an arbitrary SQL query.
+
+    See `mastersign.datascience.database.load_query()` for a description
+    of the parameters.
+    The `chunksize` must be a number of rows, ``'auto'`` is not supported.
+    Reading and writing the cache file runs in the default executor
+    of the event loop.
+
+    :return: Pandas DataFrame
+    """
+    _check_chunksize(chunksize)
+    loop = asyncio.get_running_loop()
+    cachefile, cache_key = _resolve_cachefile(
+        query, db_conn or _def_db_conn, kwargs, cachefile, cache,
+        date=date, defaults=defaults, dtype=dtype, index=index)
+    if cachefile:
+        if not os.path.isdir(os.path.dirname(cachefile)):
+            raise FileNotFoundError("The parent directory for the cache file does not exist.")
+        try:
+            return await loop.run_in_executor(None, read_cachefile, cachefile)
+        except FileNotFoundError:
+            pass
+
+    chunks = [chunk async for chunk in iter_query(
+        query, db_conn=db_conn,
+        date=date, defaults=defaults, dtype=dtype, index=index,
+        chunksize=chunksize, **kwargs)]
+    df = _concat_chunks(chunks)
+
+    if cachefile:
+        await loop.run_in_executor(
+            None, lambda: write_cachefile(df, cachefile, compress=compress_cache))
+        if cache_key:
+            _register_managed_cachefile(
+                cache_key, cache_ttl if cache_ttl is not None else _db._cache_ttl)
+
+    return df
+
+
+async def load_scalar(query, db_conn=None, **kwargs):
+    """
+    Load a single scalar from an arbitrary SQL query.
+
+    :param query:   A string as a SQL query.
+    :param db_conn: A SqlAlchemy connection string with an async driver.
+                    (optional)
+    :param kwargs:  Additional named arguments,
+                    passed to `sqlalchemy.sql.expression.TextClause.bindparams()`.
+
+    :return: A single value
+    """
+    async with get_engine(db_conn).connect() as conn:
+        return (await conn.execute(_text(query, kwargs))).scalar()
+
+
+async def load_table(name, columns=None, where=None, group_by=None, limit=None,
+                     db_conn=None, date=None, defaults=None, dtype=None, index=None,
+                     chunksize=4096, cachefile=None, compress_cache=False,
+                     cache=True, cache_ttl=None):
+    """
+    Load data from a SQL table.
+
+    See `mastersign.datascience.database.load_table()` for a description
+    of the parameters.
+    The `chunksize` must be a number of rows, ``'auto'`` is not supported.
+
+    :return: Pandas DataFrame
+    """
+    sql_query = _select_query(name,
+                              columns=columns, where=where,
+                              group_by=group_by, limit=limit)
+    return await load_query(sql_query, db_conn=db_conn,
+                            date=date, defaults=defaults, dtype=dtype, index=index,
+                            chunksize=chunksize, cachefile=cachefile,
+                            compress_cache=compress_cache,
+                            cache=cache, cache_ttl=cache_ttl)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains a lazy query builder for a single SQL table.
+
+A query is composed step by step, e.g.
+``table('invoices').select('BillingCountry', total='SUM(Total)')
+.where('Total > 1').group_by('BillingCountry').order_by('total DESC').limit(5)``,
+and the SQL is built with the same rules as `load_table()`.
+No rows are transferred before `Query.collect()`, `Query.iter()`
+or `Query.to_parquet()` is called.
+"""
+
+from . import _select_query, _write_cachefile_chunks, load_query, iter_query
+
+
+def table(name, db_conn=None):
+    """
+    Start a lazy query on a SQL table.
+
+    :param name:    The name of the table.
+    :param db_conn: A SqlAlchemy connection string. (optional)
+
+    :return: A `Query` selecting all columns and rows of the table.
+    """
+    return Query(name, db_conn=db_conn)
+
+
+class Query:
+    """
+    A lazy query on a SQL table, created by `table()`.
+
+    Every method returns a new query and leaves the original query unchanged.
+    Stacked filters are merged into one conjunction,
+    stacked projections are narrowed down to the columns selected last,
+    and aggregates, which are not selected anymore, are dropped.
+    Like in SQL, filters always apply to the rows of the table
+    before they are grouped and aggregated,
+    and the rows are limited last, therefore `where()`, `group_by()`
+    and `order_by()` can not follow `limit()`.
+
+    :ivar name:    The name of the table.
+    :ivar db_conn: The SqlAlchemy connection string or `None`.
+    """
+
+    def __init__(self, name, db_conn=None):
+        self.name = name
+        self.db_conn = db_conn
+        self._columns = None
+        self._aggregates = dict()
+        self._where = []
+        self._group_by = []
+        self._order_by = []
+        self._limit = None
+
+    def _derive(self, **changes):
+        query = Query(self.name, db_conn=self.db_conn)
+        query._columns = self._columns
+        query._aggregates = self._aggregates
+        query._where = self._where
+        query._group_by = self._group_by
+        query._order_by = self._order_by
+        query._limit = self._limit
+        for attribute, value in changes.items():
+            setattr(query, '_' + attribute, value)
+        return query
+
+    def _output_columns(self):
+        if self._columns is not None:
+            return list(self._columns)
+        if self._aggregates or self._group_by:
+            return list(self._group_by)
+        return None
+
+    def select(self, *columns, **aggregates):
+        """
+        Select columns and add aggregates.
+
+        If columns were selected before, only columns and aggregates
+        of the previous selection can be selected.
+        If only aggregates are given, they are added to the current selection.
+
+        :param columns:    Column names.
+        :param aggregates: Column aliases and SQL expressions,
+                           e.g. ``total='SUM(Total)'``.
+
+        :return: A new `Query`.
+        """
+        if not columns:
+            return self._derive(aggregates={**self._aggregates, **aggregates})
+        available = self._output_columns()
+        if available is None:
+            return self._derive(columns=list(columns),
+                                aggregates={**self._aggregates, **aggregates})
+        available = available + list(self._aggregates)
+        missing = [c for c in columns if c not in available]
+        if missing:
+            raise ValueError("The columns are not part of the previous selection: {}"
+                             .format(', '.join(missing)))
+        kept_aggregates = {alias: expression
+                           for alias, expression in self._aggregates.items()
+                           if alias in columns}
+        kept_aggregates.update(aggregates)
+        return self._derive(columns=[c for c in columns if c not in self._aggregates],
+                            aggregates=kept_aggregates)
+
+    def where(self, *conditions):
+        """
+        Filter the rows of the table.
+
+        :param conditions: Strings as conditions or iterables with strings,
+                           which form disjunctions.
+                           All conditions of all calls form a conjunction.
+
+        :return: A new `Query`.
+        """
+        if self._limit is not None:
+            raise ValueError("A filter can not follow limit().")
+        terms = list(self._where)
+        for condition in conditions:
+            # a condition with OR must not absorb the other conditions
+            term = '({})'.format(condition) if type(condition) is str else tuple(condition)
+            if term not in terms:
+                terms.append(term)
+        return self._derive(where=terms)
+
+    def group_by(self, *columns):
+        """
+        Group the rows.
+
+        Without a selection, the grouping columns are selected.
+
+        :param columns: Column names or SQL expressions.
+
+        :return: A new `Query`.
+        """
+        if self._limit is not None:
+            raise ValueError("A grouping can not follow limit().")
+        return self._derive(group_by=self._group_by + [c for c in columns
+                                                       if c not in self._group_by])
+
+    def order_by(self, *clauses):
+        """
+        Order the rows.
+
+        The clauses of a later call take precedence over the clauses
+        of an earlier call.
+
+        :param clauses: ORDER-BY-clauses, e.g. ``'Total DESC'``.
+
+        :return: A new `Query`.
+        """
+        if self._limit is not None:
+            raise ValueError("An order can not follow limit().")
+        return self._derive(order_by=list(clauses) + [c for c in self._order_by
+                                                      if c not in clauses])
+
+    def limit(self, n, offset=0):
+        """
+        Limit the number of rows.
+
+        Stacked limits are combined, e.g. ``.limit(100, offset=10).limit(5)``
+        selects the rows 10 to 14.
+
+        :param n:      The maximum number of rows.
+        :param offset: The number of rows to skip. (optional)
+
+        :return: A new `Query`.
+        """
+        if self._limit is None:
+            return self._derive(limit=(int(offset), int(n)))
+        previous_offset, previous_n = self._limit
+        return self._derive(limit=(previous_offset + int(offset),
+                                   max(0, min(previous_n - int(offset), int(n)))))
+
+    def sql(self):
+        """
+        Build the SQL query.
+
+        :return: A string with the SQL query.
+        """
+        limit = self._limit
+        if limit is not None and limit[0] == 0 and limit[1] > 0:
+            limit = limit[1]
+        return _select_query(self.name,
+                             columns=self._output_columns(), where=self._where,
+                             group_by=self._group_by, limit=limit,
+                             order_by=self._order_by, aggregates=self._aggregates)
+
+    def collect(self, **kwargs):
+        """
+        Load the result of the query.
+
+        :param kwargs: Additional named arguments,
+                       like `date`, `dtype`, `index` or bind parameters,
+                       are passed to `load_query()`.
+
+        :return: Pandas DataFrame
+        """
+        return load_query(self.sql(), db_conn=self.db_conn, **kwargs)
+
+    def iter(self, **kwargs):
+        """
+        Load the result of the query chunk by chunk.
+
+        :param kwargs: Additional named arguments,
+                       like `chunksize` or bind parameters,
+                       are passed to `iter_query()`.
+
+        :return: A generator of Pandas DataFrames
+        """
+        return iter_query(self.sql(), db_conn=self.db_conn, **kwargs)
+
+    def to_parquet(self, filename, compress=False, **kwargs):
+        """
+        Write the result of the query chunk by chunk into a Parquet file.
+
+        Every chunk becomes a row group in the file,
+        so the complete result is never held in memory.
+        An existing file is replaced.
+
+        :param filename: A path to the target Parquet file.
+        :param compress: A switch to activate GZIP compression. (optional)
+        :param kwargs:   Additional named arguments,
+                         like `chunksize` or bind parameters,
+                         are passed to `iter_query()`.
+        """
+        _write_cachefile_chunks(self.iter(**kwargs), filename, compress=compress)
+
+    def __repr__(self):
+        return 'Query({!r})'.format(self.sql())
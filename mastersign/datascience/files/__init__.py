@@ -9,7 +9,7 @@ import pandas as pd
 from fastparquet import write, ParquetFile
 
 
-def read_parquet(filename, columns=None, index=None):
+def read_parquet(filename, columns=None, index=None, filters=None):
     """
     Read the content of a Parquet file into a Pandas DataFrame.
 
@@ -23,10 +23,29 @@ def read_parquet(filename, columns=None, index=None):
                      of the file are used as index for the DataFrame.
                      If no colums are marked as index, a simple incremental
                      integer index is created.
+    :param filters:  A list of conditions like ``('column', '>=', value)``
+                     to skip row groups, which can not contain matching rows
+                     according to their statistics. (optional)
+                     The rows of the remaining row groups are not filtered.
+                     See `fastparquet.ParquetFile.to_pandas()` for details.
     :return: A Pandas DataFrame.
     """
     pf = ParquetFile(filename)
-    return pf.to_pandas(columns=columns, index=index)
+    return pf.to_pandas(columns=columns, index=index, filters=filters or [])
+
+
+def open_parquet(filename):
+    """
+    Open a Parquet file without reading its content.
+
+    The returned object gives access to the schema and the row groups
+    of the file and allows to load the data lazily,
+    e.g. with `iter_row_groups()` or `to_pandas()`.
+
+    :param filename: A path to a Parquet file.
+    :return: A `fastparquet.ParquetFile` object.
+    """
+    return ParquetFile(filename)
 
 
 def write_parquet(data: pd.DataFrame, filename, compress=False, append=False):
@@ -43,4 +62,8 @@ def write_parquet(data: pd.DataFrame, filename, compress=False, append=False):
                      The schema of the DataFrame must match the existing data
                      in the file.
     """
-    write(filename, data, compression=('GZIP' if compress else None), append=append)
+    # a named index is always stored as a column, because a RangeIndex
+    # would be stored as metadata only, which breaks appending
+    write_index = True if any(n is not None for n in data.index.names) else None
+    write(filename, data, compression=('GZIP' if compress else None), append=append,
+          write_index=write_index)